@@ -5,6 +5,7 @@ Fine-tuned thresholds: Quality control without being too strict
 """
 
 import torch
+import numpy as np
 import timm
 from PIL import Image
 import requests
@@ -54,7 +55,8 @@ class BalancedEnhanced21kVocabAnalyzer:
     
     def get_top_predictions(self, probabilities, top_k=20):
         """Get top-k predictions with confidence scores"""
-        top_indices = probabilities.argsort()[-top_k:][::-1]
+        top_k_indices = np.argpartition(probabilities, -top_k)[-top_k:]
+        top_indices = top_k_indices[np.argsort(probabilities[top_k_indices])[::-1]]
         
         predictions = []
         for i, idx in enumerate(top_indices):
@@ -12,6 +12,7 @@ from io import BytesIO
 from collections import Counter, defaultdict
 import timm
 import torch
+import numpy as np
 from torchvision import transforms
 from collections import OrderedDict
 
@@ -61,7 +62,8 @@ class FixedHybridAnalyzer:
     
     def get_top_predictions(self, probabilities, top_k=20):
         """Get top predictions with confidence scores"""
-        indices = probabilities.argsort()[::-1][:top_k]
+        top_k_indices = np.argpartition(probabilities, -top_k)[-top_k:]
+        indices = top_k_indices[np.argsort(probabilities[top_k_indices])[::-1]]
         
         predictions = []
         for i, idx in enumerate(indices):
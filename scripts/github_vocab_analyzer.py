@@ -17,6 +17,8 @@ import time
 from collections import defaultdict, Counter
 import difflib
 
+IMAGE_URL = "https://raw.githubusercontent.com/levante-framework/core-tasks/more-tasks-tested/golden-runs/vocab/vocab-{}.png"
+
 class Enhanced21kVocabAnalyzer:
     def __init__(self, model_name="tf_efficientnetv2_l.in21k", vocab_file="vocab/vocab_list.txt"):
         """Initialize analyzer with comprehensive 21k class mapping"""
@@ -53,6 +55,12 @@ class Enhanced21kVocabAnalyzer:
         # Track discovered class indices for building mapping
         self.discovered_classes = defaultdict(list)  # class_idx -> [vocab_terms_that_might_match]
         
+        # Running total over all analyze_vocabulary_dataset() calls
+        self.total_processing_time = 0.0
+        
+        # Grid cell probabilities computed ahead by preload_grid_cells(), by image URL
+        self.preloaded_cells = {}
+        
         print(f"📊 Starting with {len(self.class_mapping)} known class mappings")
     
     def predict_image(self, image):
@@ -68,6 +76,62 @@ class Enhanced21kVocabAnalyzer:
         
         return probabilities.cpu()
     
+    def predict_images(self, images, batch_size=64):
+        """Get predictions for many images, batch_size images per forward pass"""
+        probabilities = []
+        for batch_start in range(0, len(images), batch_size):
+            input_tensor = torch.stack([self.transform(image) for image in images[batch_start:batch_start + batch_size]])
+            
+            if torch.cuda.is_available():
+                input_tensor = input_tensor.pin_memory().cuda(non_blocking=True)
+            
+            with torch.no_grad():
+                outputs = self.model(input_tensor)
+                probabilities.extend(torch.nn.functional.softmax(outputs, dim=1).cpu())
+        
+        return probabilities
+    
+    def load_grid_cells(self, image_url):
+        """Download a screenshot and crop its 2x2 grid cells"""
+        response = requests.get(image_url, timeout=10)
+        image = Image.open(BytesIO(response.content)).convert('RGB')
+        
+        # Get image dimensions
+        width, height = image.size
+        
+        return {
+            'top_left': image.crop((0, 0, width//2, height//2)),
+            'top_right': image.crop((width//2, 0, width, height//2)),
+            'bottom_left': image.crop((0, height//2, width//2, height)),
+            'bottom_right': image.crop((width//2, height//2, width, height))
+        }
+    
+    def preload_grid_cells(self, start_id=4, end_id=173, batch_size=64):
+        """Download screenshots start_id..end_id and predict all their grid cells up front
+        
+        The cells of every screenshot go through the model together in large
+        batches. analyze_vocab_screenshot() then reuses these probabilities;
+        class names and mappings are still resolved image by image, so results
+        are the same as without preloading.
+        """
+        print(f"📥 Preloading vocab-{start_id:03d} to vocab-{end_id:03d}...")
+        loaded = []  # (image_url, positions) of downloaded screenshots
+        cells = []
+        for i in range(start_id, end_id + 1):
+            image_url = IMAGE_URL.format(f"{i:03d}")
+            try:
+                grid_cells = self.load_grid_cells(image_url)
+            except Exception as e:
+                self.preloaded_cells[image_url] = e
+                continue
+            loaded.append((image_url, list(grid_cells)))
+            cells.extend(grid_cells.values())
+        
+        print(f"🔍 Predicting {len(cells)} grid cells in batches of {batch_size}...")
+        probabilities = iter(self.predict_images(cells, batch_size))
+        for image_url, positions in loaded:
+            self.preloaded_cells[image_url] = {position: next(probabilities) for position in positions}
+    
     def get_top_predictions(self, probabilities, top_k=50):
         """Get top k predictions with class names"""
         top_probs, top_indices = torch.topk(probabilities, top_k)
@@ -213,11 +277,15 @@ class Enhanced21kVocabAnalyzer:
         
         return vocab_matches
     
-    def analyze_grid_cell(self, image, position, expected_vocab=None):
-        """Analyze a single grid cell with class discovery"""
+    def analyze_grid_cell(self, image, position, expected_vocab=None, probabilities=None):
+        """Analyze a single grid cell with class discovery
+        
+        `probabilities` are the cell's precomputed model outputs, if any.
+        """
         try:
             # Get predictions
-            probabilities = self.predict_image(image)
+            if probabilities is None:
+                probabilities = self.predict_image(image)
             predictions = self.get_top_predictions(probabilities, top_k=50)
             
             # Discover potential class mappings
@@ -248,28 +316,27 @@ class Enhanced21kVocabAnalyzer:
     def analyze_vocab_screenshot(self, image_url, screenshot_id, expected_vocab=None):
         """Analyze a vocabulary screenshot with enhanced class discovery"""
         try:
-            print(f"📥 Downloading {image_url}")
+            preloaded = self.preloaded_cells.pop(image_url, None)
+            if isinstance(preloaded, Exception):
+                raise preloaded
             
-            # Download image
-            response = requests.get(image_url, timeout=10)
-            image = Image.open(BytesIO(response.content)).convert('RGB')
-            
-            # Get image dimensions
-            width, height = image.size
-            
-            # Extract 2x2 grid cells
-            grid_cells = {
-                'top_left': image.crop((0, 0, width//2, height//2)),
-                'top_right': image.crop((width//2, 0, width, height//2)),
-                'bottom_left': image.crop((0, height//2, width//2, height)),
-                'bottom_right': image.crop((width//2, height//2, width, height))
-            }
+            if preloaded is None:
+                print(f"📥 Downloading {image_url}")
+                
+                # Download image and extract 2x2 grid cells
+                grid_cells = self.load_grid_cells(image_url)
+                cell_probabilities = {}
+            else:
+                # Cells were already predicted by preload_grid_cells()
+                grid_cells = dict.fromkeys(preloaded)
+                cell_probabilities = preloaded
             
             # Analyze each grid cell
             results = {}
             for position, cell_image in grid_cells.items():
                 print(f"  🔍 Analyzing {position} cell...")
-                results[position] = self.analyze_grid_cell(cell_image, position, expected_vocab)
+                results[position] = self.analyze_grid_cell(cell_image, position, expected_vocab,
+                                                           cell_probabilities.get(position))
             
             return {
                 'screenshot_id': screenshot_id,
@@ -288,8 +355,12 @@ class Enhanced21kVocabAnalyzer:
                 'success': False
             }
     
-    def analyze_vocabulary_dataset(self, start_id=4, end_id=20):
-        """Analyze vocabulary dataset with class mapping discovery"""
+    def analyze_vocabulary_dataset(self, start_id=4, end_id=20, progress_callback=None):
+        """Analyze vocabulary dataset with class mapping discovery
+        
+        `progress_callback(image_id, results)` is called after each image,
+        once the class mapping is up to date for it.
+        """
         print(f"🚀 Analyzing vocabulary dataset with EfficientNet-21k class discovery")
         print(f"📊 Processing vocab-{start_id:03d} to vocab-{end_id:03d}")
         
@@ -298,7 +369,7 @@ class Enhanced21kVocabAnalyzer:
         
         for i in range(start_id, end_id + 1):
             screenshot_id = f"{i:03d}"
-            image_url = f"https://raw.githubusercontent.com/levante-framework/core-tasks/more-tasks-tested/golden-runs/vocab/vocab-{screenshot_id}.png"
+            image_url = IMAGE_URL.format(screenshot_id)
             
             # Get expected vocabulary term (assuming vocab-001 = acorn, vocab-002 = aloe, etc.)
             expected_vocab = self.vocab_terms[i-1] if i-1 < len(self.vocab_terms) else None
@@ -309,14 +380,15 @@ class Enhanced21kVocabAnalyzer:
             results.append(result)
             
             # Build class mapping periodically
-            if i % 5 == 0:
+            if i % 5 == 0 or i == end_id:
                 self.build_class_mapping_from_discoveries()
-        
-        # Final class mapping build
-        self.build_class_mapping_from_discoveries()
+            
+            if progress_callback:
+                progress_callback(i, results)
         
         # Calculate statistics
         total_time = time.time() - start_time
+        self.total_processing_time += total_time
         successful_results = [r for r in results if r.get('success')]
         
         print(f"\n📊 Analysis Complete!")
@@ -7,29 +7,181 @@ batch processing, and performance monitoring.
 """
 
 import os
+import io
 import json
 import argparse
 import time
 from typing import List, Dict, Tuple, Optional
 from pathlib import Path
+from functools import lru_cache, partial
 import requests
 from PIL import Image
 import torch
-import torch.nn.functional as F
+from torch.utils.data import Dataset, DataLoader
+from torchvision.transforms import v2 as T
+from torchvision.io import decode_image, read_file, ImageReadMode
 import numpy as np
 from transformers import EfficientNetImageProcessor, EfficientNetForImageClassification
 import timm
 from timm.data import resolve_model_data_config, create_transform
-from difflib import SequenceMatcher
-import gc
+from rapidfuzz import fuzz, process
+
+# Recompile budget for the single/grid/full batch sizes the compiled model sees.
+# torch.compile is lazy, so this is set once at import. It is GLOBAL: it applies
+# to every module compiled in the same process, not only this classifier's.
+torch._dynamo.config.cache_size_limit = 16
+
+
+def load_image(image_path: str) -> torch.Tensor:
+    """Decode an image file or URL into a uint8 RGB (C, H, W) tensor.
+    
+    JPEG/PNG are decoded by torchvision.io (libjpeg-turbo/libpng) without
+    building a PIL image; other formats fall back to PIL (pillow-simd speeds
+    this path up if installed).
+    """
+    if image_path.startswith('http'):
+        response = requests.get(image_path)
+        response.raise_for_status()
+        data = torch.frombuffer(bytearray(response.content), dtype=torch.uint8)
+    else:
+        data = read_file(image_path)
+    
+    try:
+        return decode_image(data, mode=ImageReadMode.RGB)
+    except RuntimeError:
+        image = Image.open(io.BytesIO(data.numpy())).convert('RGB')
+        return torch.from_numpy(np.asarray(image).transpose(2, 0, 1).copy())
+
+
+def _is_readable_image(image_path) -> bool:
+    """Whether a file has a valid image header, without decoding its pixels."""
+    try:
+        with Image.open(image_path) as image:
+            image.verify()
+        return True
+    except Exception:
+        return False
+
+
+GRID_POSITIONS = ('top-left', 'top-right', 'bottom-left', 'bottom-right')
+
+
+@lru_cache(maxsize=64)
+def _grid_slices(width: int, height: int) -> Tuple[Tuple[slice, slice], ...]:
+    """(rows, cols) slices of the 2x2 grid, in GRID_POSITIONS order.
+    
+    Cached per size: directories usually share one capture resolution.
+    """
+    cell_width = width // 2
+    cell_height = height // 2
+    rows = (slice(0, cell_height), slice(cell_height, height))
+    cols = (slice(0, cell_width), slice(cell_width, width))
+    return tuple((row, col) for row in rows for col in cols)
+
+
+def extract_grid_cells(image: torch.Tensor) -> List[torch.Tensor]:
+    """Extract 2x2 grid cells from a (C, H, W) image as views."""
+    _, height, width = image.shape
+    return [image[:, rows, cols] for rows, cols in _grid_slices(width, height)]
+
+
+def _timm_preprocess(cpu_transform, image: torch.Tensor) -> np.ndarray:
+    """Resize/crop on CPU and return the image as a uint8 CHW array."""
+    return cpu_transform(image).numpy()
+
+
+def _hf_preprocess(processor, image: torch.Tensor) -> np.ndarray:
+    """Run the HuggingFace processor on one image, returning float32 CHW pixels."""
+    return processor(image.numpy(), return_tensors="np")['pixel_values'][0]
+
+
+class ImageFolderDataset(Dataset):
+    """Loads and preprocesses images on DataLoader workers.
+    
+    `preprocess` must be picklable (workers may be spawned), so it is a
+    transform or processor bound with functools.partial, never the classifier.
+    """
+    
+    def __init__(self, image_files: List[Path], preprocess, analyze_grid: bool = False):
+        self.image_files = image_files
+        self.preprocess = preprocess
+        self.analyze_grid = analyze_grid
+    
+    def __len__(self) -> int:
+        return len(self.image_files)
+    
+    def __getitem__(self, index: int) -> Dict:
+        image_path = str(self.image_files[index])
+        try:
+            image = load_image(image_path)
+        except Exception as e:
+            return {'image_path': image_path, 'error': str(e)}
+        
+        _, height, width = image.shape
+        sample = {
+            'image_path': image_path,
+            'image_size': (width, height),
+            'pixels': self.preprocess(image),
+            'error': None
+        }
+        if self.analyze_grid:
+            sample['cells'] = np.stack([self.preprocess(cell) for cell in extract_grid_cells(image)])
+        return sample
+
+
+def collate_images(samples: List[Dict]) -> Dict:
+    """Stack loaded samples into one batch tensor, keeping load errors aside.
+    
+    With grid analysis, `pixels` holds the N full images followed by their
+    4*N grid cells so the whole super-batch runs in a single forward pass.
+    """
+    loaded = [sample for sample in samples if sample['error'] is None]
+    batch = {
+        'image_paths': [sample['image_path'] for sample in loaded],
+        'image_sizes': [sample['image_size'] for sample in loaded],
+        'errors': [(sample['image_path'], sample['error']) for sample in samples if sample['error'] is not None],
+        'pixels': None
+    }
+    if loaded:
+        arrays = [sample['pixels'][None] for sample in loaded]
+        arrays += [sample['cells'] for sample in loaded if 'cells' in sample]
+        batch['pixels'] = torch.from_numpy(np.concatenate(arrays))
+    return batch
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Expose a HuggingFace classifier as pixel_values -> logits for tracing."""
+    
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
 
 class GPUOptimizedVocabularyClassifier:
     """GPU-optimized vocabulary classifier with memory management."""
     
-    def __init__(self, model_name: str = "google/efficientnet-b3", vocab_file: str = "vocab/vocab_list.txt"):
-        """Initialize the GPU-optimized classifier."""
+    def __init__(self, model_name: str = "google/efficientnet-b3", vocab_file: str = "vocab/vocab_list.txt",
+                 vocab_matcher: str = "fuzzy", precision: str = "fp16",
+                 calibration_dir: Optional[str] = None, engine_batch_size: int = 8):
+        """Initialize the GPU-optimized classifier.
+        
+        vocab_matcher selects the similarity tier of vocabulary matching:
+        "fuzzy" (RapidFuzz ratio) or "tfidf" (character n-gram TF-IDF cosine,
+        needs scikit-learn).
+        
+        precision "int8" builds a TensorRT engine calibrated on the images in
+        calibration_dir (needs torch-tensorrt and a GPU) and caches it under
+        trt_engines/; engine_batch_size is its optimal batch size.
+        """
         self.model_name = model_name
         self.vocab_file = vocab_file
+        self.vocab_matcher = vocab_matcher
+        self.precision = precision
+        self.calibration_dir = calibration_dir
+        self.engine_batch_size = engine_batch_size
         
         # GPU setup
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -44,12 +196,22 @@ class GPUOptimizedVocabularyClassifier:
         
         # Load vocabulary
         self.vocab_list = self._load_vocabulary()
+        self._build_vocab_index()
         print(f"📖 Loaded {len(self.vocab_list)} vocabulary terms")
         
         # Initialize model
         self.model = None
         self.processor = None
+        self.preprocess = None
+        self.cpu_transform = None
+        self.gpu_transform = None
         self.is_timm_model = False
+        self._id2label_arr = None
+        self._input_shape = None
+        self._staging = None
+        self._channels_last = False
+        self._trt_engine = None
+        self._copy_stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
         self._load_model()
         
         # Performance tracking
@@ -70,6 +232,27 @@ class GPUOptimizedVocabularyClassifier:
             print(f"❌ Vocabulary file not found: {self.vocab_file}")
             return []
     
+    def _build_vocab_index(self):
+        """Precompute lowercased terms plus exact and per-token lookups."""
+        self._vocab_lower = [term.lower() for term in self.vocab_list]
+        self._match_cache: Dict[Tuple[str, float], Tuple[int, float]] = {}
+        self._vocab_exact_index: Dict[str, int] = {}
+        self._vocab_token_index: Dict[str, List[int]] = {}
+        for i, term in enumerate(self._vocab_lower):
+            self._vocab_exact_index.setdefault(term, i)
+            for token in set(term.split()):
+                self._vocab_token_index.setdefault(token, []).append(i)
+        
+        # Character n-gram TF-IDF turns similarity scoring into one sparse matmul
+        self._tfidf = None
+        if self.vocab_matcher == 'tfidf' and self._vocab_lower:
+            try:
+                from sklearn.feature_extraction.text import TfidfVectorizer
+            except ImportError:
+                raise RuntimeError("TF-IDF matching needs scikit-learn: pip install scikit-learn")
+            self._tfidf = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4))
+            self._vocab_tfidf_t = self._tfidf.fit_transform(self._vocab_lower).T.tocsr()
+    
     def _load_model(self):
         """Load model with GPU optimization."""
         print(f"🔄 Loading model: {self.model_name}")
@@ -81,10 +264,10 @@ class GPUOptimizedVocabularyClassifier:
                 self.model = EfficientNetForImageClassification.from_pretrained(self.model_name)
                 self.model.to(self.device)
                 self.model.eval()
-                
-                # Enable mixed precision for faster inference
-                if self.device.type == 'cuda':
-                    self.model.half()  # Use FP16 for faster inference
+                self.preprocess = partial(_hf_preprocess, self.processor)
+                id2label = self.model.config.id2label
+                self._id2label_arr = np.array([id2label.get(i, f"class_{i}")
+                                               for i in range(self.model.config.num_labels)], dtype=object)
                 
                 print(f"✅ HuggingFace model loaded on {self.device}")
                 
@@ -99,26 +282,148 @@ class GPUOptimizedVocabularyClassifier:
                 self.model.to(self.device)
                 self.model.eval()
                 
-                # Enable mixed precision
-                if self.device.type == 'cuda':
-                    self.model.half()
-                
                 # Get transforms
                 data_config = resolve_model_data_config(self.model)
                 self.processor = create_transform(**data_config, is_training=False)
                 self.is_timm_model = True
                 
+                # Split the eval transform: resize/crop stay on CPU (uint8),
+                # dtype conversion and normalization run batched on the device
+                self._input_shape = tuple(data_config['input_size'])
+                steps = self.processor.transforms
+                to_tensor = next(i for i, t in enumerate(steps) if 'ToTensor' in type(t).__name__)
+                self.cpu_transform = T.Compose(steps[:to_tensor])
+                self.preprocess = partial(_timm_preprocess, self.cpu_transform)
+                self._id2label_arr = np.array([f"class_{i}" for i in range(self.model.num_classes)],
+                                              dtype=object)
+                self.gpu_transform = torch.nn.Sequential(
+                    T.ConvertImageDtype(torch.float32),
+                    T.Normalize(mean=data_config['mean'], std=data_config['std'])
+                ).to(self.device)
+                
                 print(f"✅ timm model loaded on {self.device}")
                 
             except Exception as e2:
                 print(f"❌ Failed to load model: {e2}")
                 raise RuntimeError(f"Could not load model {self.model_name}")
+        
+        if self.precision == 'int8':
+            if self.device.type == 'cuda':
+                self._trt_engine = self._load_int8_engine()
+            else:
+                print("⚠️  INT8 TensorRT needs a GPU, running the FP32 model instead")
+        elif self.device.type == 'cuda':
+            # NHWC lets cuDNN pick Tensor Core conv kernels without transposes
+            self.model = self.model.to(memory_format=torch.channels_last)
+            self._channels_last = True
+            
+            # Fused kernels + CUDA graph replay; batches are padded to static shapes
+            self.model = torch.compile(self.model, mode='reduce-overhead', fullgraph=False)
+            print("⚡ Model compiled with torch.compile (reduce-overhead)")
+    
+    def _load_int8_engine(self):
+        """Load the cached INT8 TensorRT engine, building it on first use.
+        
+        Calibration runs on the exact inputs the model sees (normalized float
+        pixels); the engine accepts 1..5x engine_batch_size rows so single
+        images, full batches and grid batches all fit.
+        """
+        try:
+            import torch_tensorrt
+        except ImportError:
+            raise RuntimeError("INT8 inference needs torch-tensorrt: pip install torch-tensorrt")
+        
+        engine_path = Path('trt_engines') / f"{self.model_name.replace('/', '_')}_int8_b{self.engine_batch_size}.ts"
+        if engine_path.exists():
+            print(f"📦 Loading cached INT8 engine: {engine_path}")
+            return torch.jit.load(str(engine_path), map_location=self.device)
+        
+        if not self.calibration_dir:
+            raise RuntimeError("Building an INT8 engine needs calibration images (--calibration-dir)")
+        # Files that are not images are dropped up front (header check only, no
+        # decode) so no calibration batch comes out empty
+        image_files = [path for path in self._list_images(self.calibration_dir)[:256]
+                       if _is_readable_image(path)]
+        if not image_files:
+            raise RuntimeError(f"No readable calibration images in {self.calibration_dir}")
+        print(f"🔧 Calibrating INT8 engine on {len(image_files)} images...")
+        
+        def calibration_batch(samples):
+            batch = collate_images(samples)
+            if batch['pixels'] is None:
+                raise RuntimeError(f"No calibration image in a batch could be decoded: {batch['errors']}")
+            pixels = batch['pixels'].to(self.device)
+            if self.is_timm_model:
+                pixels = self.gpu_transform(pixels)
+            # The calibrator reads the first element of each batch
+            return pixels, torch.zeros(len(pixels))
+        
+        calib_loader = DataLoader(ImageFolderDataset(image_files, self.preprocess),
+                                  batch_size=self.engine_batch_size, collate_fn=calibration_batch)
+        calibrator = torch_tensorrt.ts.ptq.DataLoaderCalibrator(
+            calib_loader, use_cache=False, device=self.device,
+            algo_type=torch_tensorrt.ts.ptq.CalibrationAlgo.ENTROPY_CALIBRATION_2)
+        
+        example = next(iter(calib_loader))[0]
+        model = self.model if self.is_timm_model else _LogitsOnly(self.model)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        
+        _, channels, height, width = example.shape
+        engine = torch_tensorrt.compile(
+            traced, ir='ts',
+            inputs=[torch_tensorrt.Input(min_shape=(1, channels, height, width),
+                                         opt_shape=(self.engine_batch_size, channels, height, width),
+                                         max_shape=(self.engine_batch_size * 5, channels, height, width),
+                                         dtype=torch.float32)],
+            enabled_precisions={torch.float32, torch.float16, torch.int8},
+            calibrator=calibrator, device=self.device)
+        
+        engine_path.parent.mkdir(exist_ok=True)
+        torch.jit.save(engine, str(engine_path))
+        print(f"💾 INT8 engine saved to {engine_path}")
+        return engine
     
     def _clear_gpu_memory(self):
-        """Clear GPU memory to prevent OOM errors."""
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            gc.collect()
+        """Release cached GPU blocks; only used when recovering from OOM."""
+        if self.device.type == 'cuda':
+            with torch.cuda.device(self.device):
+                torch.cuda.empty_cache()
+    
+    def _staging_buffer(self, n: int) -> torch.Tensor:
+        """Return a reusable (n, C, H, W) uint8 host buffer, pinned on GPU."""
+        if self._staging is None or self._staging.shape[0] < n:
+            self._staging = torch.empty((n, *self._input_shape), dtype=torch.uint8,
+                                        pin_memory=self.device.type == 'cuda')
+        return self._staging[:n]
+    
+    def _prefetch_to_device(self, loader):
+        """Yield loader batches whose pixels are already on the GPU.
+        
+        The copy of batch i+1 is issued on a side stream before batch i is
+        yielded, so the PCIe transfer overlaps the model running batch i.
+        DataLoader pinning gives each batch its own host buffer.
+        """
+        pending = None
+        for batch in loader:
+            if batch['pixels'] is not None:
+                with torch.cuda.stream(self._copy_stream):
+                    batch['pixels'] = batch['pixels'].to(self.device, non_blocking=True)
+                    batch['copied'] = torch.cuda.Event()
+                    batch['copied'].record()
+            if pending is not None:
+                yield self._wait_for_copy(pending)
+            pending = batch
+        if pending is not None:
+            yield self._wait_for_copy(pending)
+    
+    def _wait_for_copy(self, batch: Dict) -> Dict:
+        """Make the compute stream wait for a prefetched batch's copy."""
+        if batch['pixels'] is not None:
+            stream = torch.cuda.current_stream(self.device)
+            stream.wait_event(batch['copied'])
+            batch['pixels'].record_stream(stream)
+        return batch
     
     def _get_gpu_memory_usage(self) -> float:
         """Get current GPU memory usage in GB."""
@@ -126,176 +431,208 @@ class GPUOptimizedVocabularyClassifier:
             return torch.cuda.memory_allocated() / 1024**3
         return 0.0
     
-    def _similarity_score(self, text1: str, text2: str) -> float:
-        """Calculate similarity between two strings."""
-        return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+    def _similarity_matrix(self, class_names: List[str], threshold: float) -> np.ndarray:
+        """Score every class name against every vocab term (0..1).
+        
+        With the TF-IDF matcher, rows whose best cosine stays below threshold
+        fall back to the fuzzy ratio.
+        """
+        if self._tfidf is None:
+            return process.cdist(class_names, self._vocab_lower, scorer=fuzz.ratio,
+                                 score_cutoff=threshold * 100, workers=-1) / 100.0
+        
+        similarity = (self._tfidf.transform(class_names) @ self._vocab_tfidf_t).toarray()
+        fallback = similarity.max(axis=1) < threshold
+        if fallback.any():
+            similarity[fallback] = process.cdist([name for name, weak in zip(class_names, fallback) if weak],
+                                                 self._vocab_lower, scorer=fuzz.ratio,
+                                                 score_cutoff=threshold * 100, workers=-1) / 100.0
+        return similarity
+    
+    def _score_vocab(self, class_names: List[str], threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Best vocab index and score for each lowercased class name.
+        
+        Scores every (class name, vocab term) pair as a single matrix: exact
+        (1.0) > partial/substring (0.8) > shared word (0.6) > similarity.
+        """
+        # Similarity and substring matrices in one call each
+        similarity = self._similarity_matrix(class_names, threshold)
+        partial = process.cdist(class_names, self._vocab_lower, scorer=fuzz.partial_ratio,
+                                score_cutoff=100, workers=-1) == 100
+        
+        # Exact and shared-word hits come straight from the precomputed indexes
+        exact = np.zeros(similarity.shape, dtype=bool)
+        word = np.zeros(similarity.shape, dtype=bool)
+        for row, class_name in enumerate(class_names):
+            exact_index = self._vocab_exact_index.get(class_name)
+            if exact_index is not None:
+                exact[row, exact_index] = True
+            for token in set(class_name.split()):
+                word[row, self._vocab_token_index.get(token, [])] = True
+        
+        scores = np.where(exact, 1.0, np.where(partial, 0.8, np.where(word, 0.6, similarity)))
+        best_indices = scores.argmax(axis=1)
+        return best_indices, scores[np.arange(len(class_names)), best_indices]
     
     def _find_vocab_matches(self, predictions: List[Dict], threshold: float = 0.3) -> List[Dict]:
-        """Find vocabulary matches in predictions."""
-        matches = []
+        """Find vocabulary matches in predictions.
         
-        for pred in predictions:
-            class_name = pred['class_name'].lower()
-            best_match = None
-            best_score = 0
-            
-            for vocab_term in self.vocab_list:
-                vocab_lower = vocab_term.lower()
-                
-                # Exact match
-                if vocab_lower == class_name:
-                    score = 1.0
-                # Partial match
-                elif vocab_lower in class_name or class_name in vocab_lower:
-                    score = 0.8
-                # Word-level match
-                elif any(word in class_name.split() for word in vocab_lower.split()) or \
-                     any(word in vocab_lower.split() for word in class_name.split()):
-                    score = 0.6
-                # Similarity match
-                else:
-                    score = self._similarity_score(class_name, vocab_lower)
-                
-                if score > best_score and score >= threshold:
-                    best_score = score
-                    best_match = vocab_term
-            
-            if best_match:
+        Results are memoized per (class name, threshold): the label space is
+        small and the same names recur across images, cells and batches.
+        """
+        if not predictions or not self.vocab_list:
+            return []
+        
+        class_names = [pred['class_name'].lower() for pred in predictions]
+        
+        # Only score names that have not been seen before
+        new_names = list(dict.fromkeys(name for name in class_names
+                                       if (name, threshold) not in self._match_cache))
+        if new_names:
+            best_indices, best_scores = self._score_vocab(new_names, threshold)
+            for name, best_index, best_score in zip(new_names, best_indices, best_scores):
+                self._match_cache[(name, threshold)] = (int(best_index), float(best_score))
+        
+        matches = []
+        for pred, class_name in zip(predictions, class_names):
+            best_index, best_score = self._match_cache[(class_name, threshold)]
+            if best_score > 0 and best_score >= threshold:
                 matches.append({
                     'prediction': pred,
-                    'vocab_term': best_match,
+                    'vocab_term': self.vocab_list[best_index],
                     'match_score': best_score,
                     'match_type': 'exact' if best_score == 1.0 else 'partial' if best_score >= 0.8 else 'similarity'
                 })
         
         return sorted(matches, key=lambda x: x['match_score'], reverse=True)
     
-    def _classify_image_batch(self, images: List[Image.Image], top_k: int = 10) -> List[List[Dict]]:
-        """Classify multiple images in a batch for GPU efficiency."""
-        if not images:
-            return []
+    def _autocast(self):
+        """FP16 autocast on CUDA; a no-op on CPU."""
+        return torch.autocast(device_type=self.device.type, dtype=torch.float16,
+                              enabled=self.device.type == 'cuda')
+    
+    def _record_batch(self, num_images: int, batch_time: float):
+        """Track performance for one classified batch."""
+        self.stats['batch_times'].append(batch_time)
+        self.stats['total_images'] += num_images
+        self.stats['total_time'] += batch_time
+        self.stats['gpu_memory_used'] = max(self.stats['gpu_memory_used'], self._get_gpu_memory_usage())
+    
+    def _predict_batch(self, batch: torch.Tensor, top_k: int = 10,
+                       pad_to: Optional[int] = None) -> List[List[Dict]]:
+        """Run the model on a preprocessed batch and return top-k predictions.
         
-        start_time = time.time()
+        timm batches are uint8 and normalized on the device; HuggingFace batches
+        are already-normalized float32 pixel values. If pad_to is given, the batch
+        is padded on the device to that many rows so the compiled model always
+        sees the same shape; padded rows are ignored.
+        """
+        num_images = batch.shape[0]
         
         try:
-            if self.is_timm_model:
-                # Process images for timm
-                inputs = []
-                for image in images:
-                    if isinstance(self.processor, torch.nn.Module):
-                        tensor = self.processor(image)
-                    else:
-                        tensor = self.processor(image)
-                    inputs.append(tensor)
-                
-                # Stack into batch
-                batch_tensor = torch.stack(inputs).to(self.device)
-                if self.device.type == 'cuda':
-                    batch_tensor = batch_tensor.half()
-                
-                # Run inference
-                with torch.no_grad():
-                    outputs = self.model(batch_tensor)
-                    probabilities = F.softmax(outputs, dim=1)
-                
-                # Get top predictions for each image
-                top_probs, top_indices = torch.topk(probabilities, top_k, dim=1)
-                
-                results = []
-                for i in range(len(images)):
-                    predictions = []
-                    for j, (prob, idx) in enumerate(zip(top_probs[i], top_indices[i])):
-                        predictions.append({
-                            'class_name': f"class_{idx.item()}",
-                            'confidence': prob.item(),
-                            'rank': j + 1,
-                            'class_index': idx.item()
-                        })
-                    results.append(predictions)
+            with torch.inference_mode(), self._autocast():
+                inputs = batch.to(self.device, non_blocking=True)
+                if pad_to and num_images < pad_to:
+                    inputs = torch.cat([inputs, inputs.new_zeros((pad_to - num_images, *inputs.shape[1:]))])
                 
-            else:
-                # Process images for HuggingFace
-                inputs = self.processor(images, return_tensors="pt").to(self.device)
-                if self.device.type == 'cuda':
-                    inputs = {k: v.half() if v.dtype == torch.float32 else v for k, v in inputs.items()}
-                
-                # Run inference
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    probabilities = F.softmax(outputs.logits, dim=1)
+                if self.is_timm_model:
+                    inputs = self.gpu_transform(inputs)
+                if self._channels_last:
+                    inputs = inputs.contiguous(memory_format=torch.channels_last)
                 
-                # Get top predictions for each image
-                top_probs, top_indices = torch.topk(probabilities, top_k, dim=1)
+                if self._trt_engine is not None:
+                    logits = self._trt_engine(inputs.float())
+                elif self.is_timm_model:
+                    logits = self.model(inputs)
+                else:
+                    logits = self.model(pixel_values=inputs).logits
                 
-                results = []
-                for i in range(len(images)):
-                    predictions = []
-                    for j, (prob, idx) in enumerate(zip(top_probs[i], top_indices[i])):
-                        class_name = self.model.config.id2label.get(idx.item(), f"class_{idx.item()}")
-                        predictions.append({
-                            'class_name': class_name,
-                            'confidence': prob.item(),
-                            'rank': j + 1,
-                            'class_index': idx.item()
-                        })
-                    results.append(predictions)
-            
-            # Track performance
-            batch_time = time.time() - start_time
-            self.stats['batch_times'].append(batch_time)
-            self.stats['total_images'] += len(images)
-            self.stats['total_time'] += batch_time
-            self.stats['gpu_memory_used'] = max(self.stats['gpu_memory_used'], self._get_gpu_memory_usage())
-            
-            return results
+                # Rank on raw logits (softmax is monotonic), then turn only the
+                # top-k into globally normalized probabilities
+                logits = logits.float()
+                top_logits, top_indices = torch.topk(logits, top_k, dim=1)
+                top_probs = torch.exp(top_logits - torch.logsumexp(logits, dim=1, keepdim=True))
             
         except RuntimeError as e:
             if "out of memory" in str(e):
                 print(f"⚠️  GPU out of memory, clearing cache and retrying with smaller batch...")
                 self._clear_gpu_memory()
                 # Retry with smaller batch
-                if len(images) > 1:
-                    mid = len(images) // 2
-                    results1 = self._classify_image_batch(images[:mid], top_k)
-                    results2 = self._classify_image_batch(images[mid:], top_k)
+                if num_images > 1:
+                    mid = num_images // 2
+                    results1 = self._predict_batch(batch[:mid], top_k)
+                    results2 = self._predict_batch(batch[mid:], top_k)
                     return results1 + results2
                 else:
                     raise e
             else:
                 raise e
+        
+        # One bulk transfer per tensor (padded rows dropped on the device), then
+        # plain Python lists so the loop does no per-element tensor/NumPy work
+        top_probs_list = top_probs[:num_images].cpu().tolist()
+        top_indices_np = top_indices[:num_images].cpu().numpy()
+        class_names = self._id2label_arr[top_indices_np].tolist()
+        top_indices_list = top_indices_np.tolist()
+        
+        results = []
+        for names, probs, indices in zip(class_names, top_probs_list, top_indices_list):
+            predictions = []
+            for j, (name, prob, idx) in enumerate(zip(names, probs, indices)):
+                predictions.append({
+                    'class_name': name,
+                    'confidence': prob,
+                    'rank': j + 1,
+                    'class_index': idx
+                })
+            results.append(predictions)
+        
+        return results
     
-    def _extract_grid_cells(self, image: Image.Image) -> List[Image.Image]:
-        """Extract 2x2 grid cells from image."""
-        width, height = image.size
-        cell_width = width // 2
-        cell_height = height // 2
+    def _classify_image_batch(self, images: List[torch.Tensor], top_k: int = 10,
+                              pad_to: Optional[int] = None) -> List[List[Dict]]:
+        """Classify multiple images in a batch for GPU efficiency.
         
-        cells = []
-        positions = [
-            (0, 0, cell_width, cell_height),  # top-left
-            (cell_width, 0, width, cell_height),  # top-right
-            (0, cell_height, cell_width, height),  # bottom-left
-            (cell_width, cell_height, width, height)  # bottom-right
-        ]
+        The list is emptied once the batch is preprocessed, so the decoded
+        images are freed before inference instead of after it.
+        """
+        if not images:
+            return []
         
-        for pos in positions:
-            cell = image.crop(pos)
-            cells.append(cell)
+        start_time = time.time()
+        num_images = len(images)
         
-        return cells
+        if self.is_timm_model:
+            # Resize/crop on CPU straight into a pinned uint8 batch
+            batch = self._staging_buffer(len(images))
+            batch_np = batch.numpy()
+            for i, image in enumerate(images):
+                batch_np[i] = self.preprocess(image)
+        else:
+            # Process images for HuggingFace
+            batch = self.processor([image.numpy() for image in images],
+                                   return_tensors="pt")['pixel_values']
+        images.clear()
+        
+        results = self._predict_batch(batch, top_k, pad_to)
+        self._record_batch(num_images, time.time() - start_time)
+        
+        return results
+    
+    def _extract_grid_cells(self, image: torch.Tensor) -> List[torch.Tensor]:
+        """Extract 2x2 grid cells from image."""
+        return extract_grid_cells(image)
     
     def classify_image(self, image_path: str, analyze_grid: bool = False, top_k: int = 10) -> Dict:
         """Classify a single image with GPU optimization."""
         try:
             # Load image
-            if image_path.startswith('http'):
-                image = Image.open(requests.get(image_path, stream=True).raw).convert('RGB')
-            else:
-                image = Image.open(image_path).convert('RGB')
+            image = load_image(image_path)
+            _, height, width = image.shape
             
             results = {
                 'image_path': image_path,
-                'image_size': image.size,
+                'image_size': (width, height),
                 'model_name': self.model_name,
                 'device': str(self.device),
                 'full_image': None,
@@ -315,8 +652,10 @@ class GPUOptimizedVocabularyClassifier:
                 if 0 <= vocab_index < len(self.vocab_list):
                     results['expected_vocab'] = self.vocab_list[vocab_index]
             
-            # Classify full image
-            predictions_batch = self._classify_image_batch([image], top_k)
+            # Classify full image (and its grid cells in the same forward pass)
+            images = [image] + (self._extract_grid_cells(image) if analyze_grid else [])
+            del image
+            predictions_batch = self._classify_image_batch(images, top_k)
             predictions = predictions_batch[0] if predictions_batch else []
             vocab_matches = self._find_vocab_matches(predictions)
             
@@ -327,15 +666,14 @@ class GPUOptimizedVocabularyClassifier:
             
             # Grid cell analysis
             if analyze_grid:
-                cells = self._extract_grid_cells(image)
-                cell_predictions_batch = self._classify_image_batch(cells, top_k)
+                cell_predictions_batch = predictions_batch[1:]
                 
                 cell_results = []
                 for i, cell_predictions in enumerate(cell_predictions_batch):
                     cell_vocab_matches = self._find_vocab_matches(cell_predictions)
                     
                     cell_results.append({
-                        'position': ['top-left', 'top-right', 'bottom-left', 'bottom-right'][i],
+                        'position': GRID_POSITIONS[i],
                         'predictions': cell_predictions,
                         'vocab_matches': cell_vocab_matches
                     })
@@ -373,9 +711,8 @@ class GPUOptimizedVocabularyClassifier:
                 'error': str(e)
             }
     
-    def batch_classify(self, image_dir: str, output_file: str = None, analyze_grid: bool = False, 
-                      batch_size: int = 8) -> List[Dict]:
-        """Batch classify images with GPU optimization."""
+    def _list_images(self, image_dir) -> List[Path]:
+        """List the image files directly inside a directory."""
         image_dir = Path(image_dir)
         image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}
         
@@ -383,99 +720,122 @@ class GPUOptimizedVocabularyClassifier:
         for ext in image_extensions:
             image_files.extend(image_dir.glob(f'*{ext}'))
             image_files.extend(image_dir.glob(f'*{ext.upper()}'))
+        return image_files
+    
+    def batch_classify(self, image_dir: str, output_file: str = None, analyze_grid: bool = False, 
+                      batch_size: int = 8, jsonl: bool = False) -> List[Dict]:
+        """Batch classify images with GPU optimization.
+        
+        With jsonl=True each result is written to output_file as one JSON line
+        as soon as its batch finishes, and only a small per-image summary
+        (path, error, expected vocab, best match) is kept and returned.
+        """
+        image_files = self._list_images(image_dir)
         
         print(f"📁 Found {len(image_files)} images in {image_dir}")
         print(f"🔧 Using batch size: {batch_size}")
         
+        # Decode and preprocess on worker processes while the GPU runs the previous batch
+        dataset = ImageFolderDataset(image_files, self.preprocess, analyze_grid)
+        loader = DataLoader(dataset, batch_size=batch_size, num_workers=min(8, os.cpu_count() or 1),
+                            pin_memory=self.device.type == 'cuda', prefetch_factor=2,
+                            collate_fn=collate_images)
+        
         results = []
+        out_f = open(output_file, 'w', encoding='utf-8') if output_file and jsonl else None
         
-        # Process in batches for GPU efficiency
-        for i in range(0, len(image_files), batch_size):
-            batch_files = image_files[i:i + batch_size]
-            print(f"🔄 Processing batch {i//batch_size + 1}/{(len(image_files) + batch_size - 1)//batch_size}")
-            
-            # Load batch of images
-            batch_images = []
-            batch_paths = []
-            
-            for image_file in batch_files:
-                try:
-                    image = Image.open(image_file).convert('RGB')
-                    batch_images.append(image)
-                    batch_paths.append(str(image_file))
-                except Exception as e:
-                    print(f"⚠️  Error loading {image_file}: {e}")
-                    results.append({
-                        'image_path': str(image_file),
-                        'error': str(e)
-                    })
-            
-            if batch_images:
-                # Classify batch
-                batch_start = time.time()
-                batch_predictions = self._classify_image_batch(batch_images, top_k=10)
-                batch_time = time.time() - batch_start
+        def keep(result: Dict):
+            if out_f is None:
+                results.append(result)
+                return
+            out_f.write(json.dumps(result, ensure_ascii=False) + '\n')
+            results.append({key: result[key] for key in ('image_path', 'error', 'expected_vocab', 'best_match')
+                            if key in result})
+        
+        try:
+            # Process in batches for GPU efficiency
+            batches = self._prefetch_to_device(loader) if self._copy_stream is not None else loader
+            for batch_index, batch in enumerate(batches):
+                print(f"🔄 Processing batch {batch_index + 1}/{len(loader)}")
                 
-                # Process results
-                for j, (image_path, predictions) in enumerate(zip(batch_paths, batch_predictions)):
-                    vocab_matches = self._find_vocab_matches(predictions)
-                    
-                    result = {
+                for image_path, error in batch['errors']:
+                    print(f"⚠️  Error loading {image_path}: {error}")
+                    keep({
                         'image_path': image_path,
-                        'image_size': batch_images[j].size,
-                        'model_name': self.model_name,
-                        'device': str(self.device),
-                        'full_image': {
-                            'predictions': predictions,
-                            'vocab_matches': vocab_matches
-                        },
-                        'processing_time': batch_time / len(batch_images),
-                        'gpu_memory_used': self._get_gpu_memory_usage()
-                    }
-                    
-                    # Extract expected vocab
-                    filename = Path(image_path).stem
-                    if filename.startswith('vocab-') and filename[6:].isdigit():
-                        vocab_index = int(filename[6:]) - 1
-                        if 0 <= vocab_index < len(self.vocab_list):
-                            result['expected_vocab'] = self.vocab_list[vocab_index]
+                        'error': error
+                    })
+                
+                if batch['pixels'] is not None:
+                    # Classify batch (full images followed by their grid cells)
+                    num_images = len(batch['image_paths'])
+                    batch_start = time.time()
+                    all_predictions = self._predict_batch(batch['pixels'], top_k=10,
+                                                          pad_to=batch_size * (5 if analyze_grid else 1))
+                    batch_time = time.time() - batch_start
+                    self._record_batch(len(all_predictions), batch_time)
+                    batch_predictions = all_predictions[:num_images]
+                    batch_cell_predictions = all_predictions[num_images:]
                     
-                    # Grid analysis (if requested)
-                    if analyze_grid:
-                        cells = self._extract_grid_cells(batch_images[j])
-                        cell_predictions_batch = self._classify_image_batch(cells, top_k=10)
+                    # Process results
+                    for j, (image_path, predictions) in enumerate(zip(batch['image_paths'], batch_predictions)):
+                        vocab_matches = self._find_vocab_matches(predictions)
                         
-                        cell_results = []
-                        for k, cell_predictions in enumerate(cell_predictions_batch):
-                            cell_vocab_matches = self._find_vocab_matches(cell_predictions)
-                            cell_results.append({
-                                'position': ['top-left', 'top-right', 'bottom-left', 'bottom-right'][k],
-                                'predictions': cell_predictions,
-                                'vocab_matches': cell_vocab_matches
-                            })
+                        result = {
+                            'image_path': image_path,
+                            'image_size': batch['image_sizes'][j],
+                            'model_name': self.model_name,
+                            'device': str(self.device),
+                            'full_image': {
+                                'predictions': predictions,
+                                'vocab_matches': vocab_matches
+                            },
+                            'processing_time': batch_time / num_images,
+                            'gpu_memory_used': self._get_gpu_memory_usage()
+                        }
                         
-                        result['grid_cells'] = cell_results
+                        # Extract expected vocab
+                        filename = Path(image_path).stem
+                        if filename.startswith('vocab-') and filename[6:].isdigit():
+                            vocab_index = int(filename[6:]) - 1
+                            if 0 <= vocab_index < len(self.vocab_list):
+                                result['expected_vocab'] = self.vocab_list[vocab_index]
                         
-                        # Find best match
-                        all_matches = []
-                        for match in vocab_matches:
-                            all_matches.append({'position': 'full-image', 'match': match})
-                        for cell_result in cell_results:
-                            for match in cell_result['vocab_matches']:
-                                all_matches.append({'position': cell_result['position'], 'match': match})
+                        # Grid analysis (if requested)
+                        if analyze_grid:
+                            cell_predictions_batch = batch_cell_predictions[4 * j:4 * j + 4]
+                            
+                            cell_results = []
+                            for k, cell_predictions in enumerate(cell_predictions_batch):
+                                cell_vocab_matches = self._find_vocab_matches(cell_predictions)
+                                cell_results.append({
+                                    'position': GRID_POSITIONS[k],
+                                    'predictions': cell_predictions,
+                                    'vocab_matches': cell_vocab_matches
+                                })
+                            
+                            result['grid_cells'] = cell_results
+                            
+                            # Find best match
+                            all_matches = []
+                            for match in vocab_matches:
+                                all_matches.append({'position': 'full-image', 'match': match})
+                            for cell_result in cell_results:
+                                for match in cell_result['vocab_matches']:
+                                    all_matches.append({'position': cell_result['position'], 'match': match})
+                            
+                            if all_matches:
+                                best_match = max(all_matches, key=lambda x: x['match']['match_score'])
+                                result['best_match'] = best_match
                         
-                        if all_matches:
-                            best_match = max(all_matches, key=lambda x: x['match']['match_score'])
-                            result['best_match'] = best_match
-                    
-                    results.append(result)
-                
-                # Clear GPU memory periodically
-                if i % (batch_size * 4) == 0:
-                    self._clear_gpu_memory()
+                        keep(result)
+        finally:
+            if out_f is not None:
+                out_f.close()
         
         # Save results
-        if output_file:
+        if out_f is not None:
+            print(f"💾 Results streamed to {output_file}")
+        elif output_file:
             with open(output_file, 'w', encoding='utf-8') as f:
                 json.dump(results, f, indent=2, ensure_ascii=False)
             print(f"💾 Results saved to {output_file}")
@@ -507,6 +867,8 @@ def main():
     parser.add_argument('--image', help='Single image to classify')
     parser.add_argument('--batch', help='Directory of images to classify')
     parser.add_argument('--output', help='Output JSON file for results')
+    parser.add_argument('--jsonl', action='store_true',
+                       help='Stream batch results to --output as JSON Lines')
     parser.add_argument('--grid', action='store_true',
                        help='Analyze 2x2 grid cells')
     parser.add_argument('--batch-size', type=int, default=8,
@@ -515,13 +877,25 @@ def main():
                        help='Number of top predictions to return')
     parser.add_argument('--stats', action='store_true',
                        help='Show performance statistics')
+    parser.add_argument('--matcher', choices=['fuzzy', 'tfidf'], default='fuzzy',
+                       help='Similarity scoring for vocabulary matches')
+    parser.add_argument('--precision', choices=['fp16', 'int8'], default='fp16',
+                       help='Inference precision (int8 builds a calibrated TensorRT engine)')
+    parser.add_argument('--calibration-dir',
+                       help='Images used to calibrate the INT8 engine (defaults to --batch)')
     
     args = parser.parse_args()
+    if args.jsonl and not args.output:
+        parser.error('--jsonl requires --output')
     
     # Initialize GPU-optimized classifier
     classifier = GPUOptimizedVocabularyClassifier(
         model_name=args.model, 
-        vocab_file=args.vocab
+        vocab_file=args.vocab,
+        vocab_matcher=args.matcher,
+        precision=args.precision,
+        calibration_dir=args.calibration_dir or args.batch,
+        engine_batch_size=args.batch_size
     )
     
     if args.image:
@@ -535,7 +909,8 @@ def main():
             args.batch, 
             args.output, 
             analyze_grid=args.grid, 
-            batch_size=args.batch_size
+            batch_size=args.batch_size,
+            jsonl=args.jsonl
         )
         
         print(f"\n📊 Processed {len(results)} images")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Grid Analyzer Base
+Shared batched inference core for the hybrid and location-aware analyzers
+"""
+
+import os
+import json
+import hashlib
+import requests
+from PIL import Image
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import timm
+import torch
+from torchvision import transforms
+
+GRID_POSITIONS = ('top_left', 'top_right', 'bottom_left', 'bottom_right')
+IMAGE_URL = "https://raw.githubusercontent.com/levante-framework/core-tasks/more-tasks-tested/golden-runs/vocab/vocab-{}.png"
+# Concurrent image downloads, and how many images the prefetcher keeps in flight
+DOWNLOAD_THREADS = 16
+# Fields kept in memory for each image when full results are streamed to JSON Lines
+RESULT_SUMMARY_KEYS = ('screenshot_id', 'expected_vocab', 'success', 'error',
+                       'has_correct_detection', 'has_any_detection')
+
+class GridAnalyzerBase:
+    """Loads an EfficientNet-21k backbone and predicts an image's 4 grid cells in one batch.
+    
+    Subclasses only add their own mapping discovery/matching policy on top of
+    predict_grid(); they may override _setup_preprocessing(), load_image() and
+    _grid_cell_batch() to change how cells are prepared.
+    
+    With `cache_dir` set, each image's cell predictions are stored on disk so
+    reruns skip both the download and the forward pass; with `use_trt` the
+    built TensorRT engine is kept there too. `batch_images` is how
+    many images predict_grids() is sized for (4 cells each). `quantize`
+    applies dynamic INT8 quantization when running on the CPU.
+    """
+    
+    def __init__(self, model_name, use_trt=False, cache_dir=None, batch_images=1, quantize=False,
+                 **model_kwargs):
+        # Initialize model
+        self.model_name = model_name
+        self.batch_images = batch_images
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model = timm.create_model(model_name, pretrained=True, **model_kwargs)
+        self.model.to(self.device)
+        self.model.eval()
+        self.num_classes = self.model.num_classes
+        
+        self._setup_preprocessing()
+        
+        if quantize and self.device.type == 'cpu':
+            # Dynamic quantization covers nn.Linear only, which here is mostly the 21k-class head
+            print(f"🔧 Quantizing model to INT8 for CPU inference...")
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        
+        if self.device.type == 'cuda':
+            # NHWC lets cuDNN pick Tensor Core conv kernels under FP16 autocast
+            self.model = self.model.to(memory_format=torch.channels_last)
+            if use_trt:
+                self.model = self._build_trt_engine(self.input_size)
+            else:
+                # Fused kernels + CUDA graph replay for the fixed-size cell batch
+                self.model = torch.compile(self.model, mode="reduce-overhead", fullgraph=False)
+            # One warm-up pass pays the compile/build cost before the first image
+            with torch.inference_mode(), self._autocast():
+                self.model(torch.zeros((4 * batch_images, *self.input_size), device=self.device)
+                           .contiguous(memory_format=torch.channels_last))
+        
+        # One download thread per pooled keep-alive connection
+        self._download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_THREADS)
+        # Keep-alive connections shared by the download threads, so each image
+        # after the first skips the TCP/TLS handshake
+        self._http = requests.Session()
+        self._http.mount("https://", requests.adapters.HTTPAdapter(pool_connections=DOWNLOAD_THREADS,
+                                                                   pool_maxsize=DOWNLOAD_THREADS))
+    
+    def _setup_preprocessing(self):
+        """Default preprocessing: 224x224 resize on the device with ImageNet mean/std"""
+        self.input_size = (3, 224, 224)
+        self.cell_transform = transforms.Resize((224, 224), antialias=True)
+        self._set_normalization([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    
+    def _set_normalization(self, mean, std):
+        """Store mean/std scaled to 0-255 so normalization is one in-place op on the device"""
+        self._mean = torch.tensor(mean, device=self.device).view(1, -1, 1, 1) * 255
+        self._std = torch.tensor(std, device=self.device).view(1, -1, 1, 1) * 255
+    
+    def _autocast(self):
+        """FP16 autocast on CUDA; a no-op context on CPU"""
+        return torch.autocast(device_type=self.device.type, dtype=torch.float16,
+                              enabled=self.device.type == 'cuda')
+    
+    def _build_trt_engine(self, input_size):
+        """Compile the backbone into an FP16 TensorRT engine for up to batch_images x 4 cells
+        
+        With `cache_dir` set, the engine is saved there and later runs load it
+        instead of rebuilding it.
+        """
+        try:
+            import torch_tensorrt
+        except ImportError:
+            raise RuntimeError("TensorRT inference needs torch-tensorrt: pip install torch-tensorrt")
+        
+        engine_path = None
+        if self.cache_dir:
+            # Engines are specific to the GPU and TensorRT version they were built with
+            key = (f"{self.model_name}\n{input_size}\n{self.batch_images}\n"
+                   f"{torch_tensorrt.__version__}\n{torch.cuda.get_device_name(self.device)}")
+            key = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+            engine_path = os.path.join(self.cache_dir, f"trt_{key}.ep")
+            if os.path.exists(engine_path):
+                print(f"🔧 Loading cached TensorRT FP16 engine...")
+                return torch_tensorrt.load(engine_path).module()
+        
+        print(f"🔧 Building TensorRT FP16 engine...")
+        engine = torch_tensorrt.compile(
+            self.model, ir='dynamo',
+            inputs=[torch_tensorrt.Input(min_shape=(1, *input_size), opt_shape=(4 * self.batch_images, *input_size),
+                                         max_shape=(4 * self.batch_images, *input_size), dtype=torch.float32)],
+            enabled_precisions={torch.float32, torch.float16})
+        
+        if engine_path:
+            example = torch.zeros((4 * self.batch_images, *input_size), device=self.device)
+            torch_tensorrt.save(engine, engine_path, inputs=[example])
+        return engine
+    
+    def predict_image(self, image):
+        """Predict image using EfficientNet-21k"""
+        return self.predict_images([image])[0]
+    
+    def predict_images(self, images):
+        """Predict several PIL images (e.g. the 4 grid cells) in one forward pass"""
+        return self.predict_batch(torch.stack([
+            self.cell_transform(transforms.functional.pil_to_tensor(image).to(self.device).float())
+            for image in images
+        ]))
+    
+    def predict_batch(self, batch):
+        """Predict a preprocessed (N, C, H, W) batch of 0-255 pixel values in one forward pass"""
+        # Softmax in FP32 for numerical safety
+        return torch.nn.functional.softmax(self.predict_logits(batch), dim=1)
+    
+    def predict_logits(self, batch):
+        """FP32 logits for a preprocessed (N, C, H, W) batch of 0-255 pixel values"""
+        input_tensor = batch.to(self.device, non_blocking=True).float().sub_(self._mean).div_(self._std)
+        if self.device.type == 'cuda':
+            input_tensor = input_tensor.contiguous(memory_format=torch.channels_last)
+        
+        with torch.inference_mode(), self._autocast():
+            return self.model(input_tensor).float()
+    
+    def get_top_predictions(self, probabilities, top_k=20):
+        """Get top-k predictions with confidence scores"""
+        return self.get_top_predictions_batch(probabilities.unsqueeze(0), top_k)[0]
+    
+    def get_top_predictions_batch(self, probabilities, top_k=20):
+        """Top-k predictions for every row of an (N, classes) probability batch"""
+        # One top-k on the device and one copy back of the k values/indices per row
+        top_probs, top_indices = torch.topk(probabilities, top_k, dim=1)
+        return self._prediction_dicts(top_probs, top_indices)
+    
+    def get_top_predictions_from_logits(self, logits, top_k=20):
+        """Top-k predictions for every row of an (N, classes) logit batch
+        
+        Softmax is monotonic, so the top-k of the logits are the top-k classes;
+        only those k get a probability, exp(logit - logsumexp(row)), instead of
+        normalizing every class.
+        """
+        top_logits, top_indices = torch.topk(logits, top_k, dim=1)
+        top_probs = (top_logits - torch.logsumexp(logits, dim=1, keepdim=True)).exp_()
+        return self._prediction_dicts(top_probs, top_indices)
+    
+    def _prediction_dicts(self, top_probs, top_indices):
+        """Prediction dicts from (N, k) top-k probabilities and class indices"""
+        batch_predictions = []
+        for row_probs, row_indices in zip(top_probs.cpu().tolist(), top_indices.cpu().tolist()):
+            predictions = []
+            for i, (confidence, idx) in enumerate(zip(row_probs, row_indices)):
+                predictions.append({
+                    'rank': i + 1,
+                    'class_idx': idx,
+                    'class_name': f"class_{idx}",
+                    'confidence': confidence,
+                    'confidence_percent': confidence * 100
+                })
+            batch_predictions.append(predictions)
+        
+        return batch_predictions
+    
+    def load_image(self, image_url):
+        """Download an image and decode it into a uint8 (C, H, W) tensor"""
+        response = self._http.get(image_url, timeout=10)
+        full_image = Image.open(BytesIO(response.content)).convert('RGB')
+        
+        # Get image dimensions
+        width, height = full_image.size
+        
+        image = transforms.functional.pil_to_tensor(full_image)
+        if self.device.type == 'cuda':
+            # Pinned so the upload can run asynchronously
+            image = image.pin_memory()
+        return (width, height), image
+    
+    def _grid_cell_batch(self, image, width, height):
+        """Upload an image once and preprocess its 2x2 grid cells (GRID_POSITIONS order) on the device"""
+        image = image.to(self.device, non_blocking=True)
+        grid_cells = [
+            image[:, :height//2, :width//2],
+            image[:, :height//2, width//2:],
+            image[:, height//2:, :width//2],
+            image[:, height//2:, width//2:]
+        ]
+        if all(cell.shape == grid_cells[0].shape for cell in grid_cells):
+            # Even-sized images split into equal cells, which resize as one batch
+            return self.cell_transform(torch.stack(grid_cells).float())
+        return torch.stack([self.cell_transform(cell.float()) for cell in grid_cells])
+    
+    def _cache_path(self, image_url):
+        """Disk cache file for an image URL's cell predictions (None when caching is off)"""
+        if not self.cache_dir:
+            return None
+        # Analyzers preprocess cells differently, so the class is part of the key
+        key = f"{type(self).__name__}\n{self.model_name}\n{image_url}"
+        key = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def _load_cached_grid(self, image_url, top_k):
+        """Cached ((width, height), cell predictions) for an URL, or None on a miss"""
+        cache_path = self._cache_path(image_url)
+        if not cache_path or not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None  # Unreadable cache files are re-predicted and overwritten
+        if cached['top_k'] < top_k:
+            return None
+        return tuple(cached['size']), [predictions[:top_k] for predictions in cached['cells']]
+    
+    def _prefetch_images(self, urls, ahead=DOWNLOAD_THREADS):
+        """Yield a load_image future per URL, keeping up to `ahead` more in flight.
+        
+        Download and decode run on the pool, so the next images are ready
+        while the GPU works on the current one. URLs already in the disk
+        cache are not downloaded and yield None.
+        """
+        futures = []
+        for url in urls:
+            cache_path = self._cache_path(url)
+            if cache_path and os.path.exists(cache_path):
+                futures.append(None)
+            else:
+                futures.append(self._download_pool.submit(self.load_image, url))
+            if len(futures) > ahead:
+                yield futures.pop(0)
+        while futures:
+            yield futures.pop(0)
+    
+    def _record_result(self, result, jsonl_f=None):
+        """Append an image result to self.results.
+        
+        With an open JSON Lines file the full result is written there and
+        only its RESULT_SUMMARY_KEYS fields are kept in memory.
+        """
+        if jsonl_f is None:
+            self.results.append(result)
+            return
+        jsonl_f.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self.results.append({key: result[key] for key in RESULT_SUMMARY_KEYS if key in result})
+    
+    def predict_grid(self, image_url, prefetched=None, top_k=20):
+        """Predict an image's 4 grid cells in one forward pass and one top-k.
+        
+        Returns the image (width, height) and a prediction list per cell in
+        GRID_POSITIONS order. `prefetched` is a _prefetch_images future.
+        """
+        grid = self.predict_grids([image_url], [prefetched], top_k)[0]
+        if isinstance(grid, Exception):
+            raise grid
+        return grid
+    
+    def predict_grids(self, image_urls, prefetched=None, top_k=20):
+        """Predict the grid cells of several images in one forward pass and one top-k.
+        
+        Returns, per image, what predict_grid() returns or the exception raised
+        while loading it, so one bad download does not fail the whole batch.
+        """
+        grids = [None] * len(image_urls)
+        cell_batches = []
+        loaded = []  # (index, url, size) of images whose cells are in cell_batches
+        for i, image_url in enumerate(image_urls):
+            grids[i] = self._load_cached_grid(image_url, top_k)
+            if grids[i] is not None:
+                continue
+            try:
+                future = prefetched[i] if prefetched is not None else None
+                (width, height), image = future.result() if future is not None else self.load_image(image_url)
+                cell_batches.append(self._grid_cell_batch(image, width, height))
+                loaded.append((i, image_url, (width, height)))
+            except Exception as e:
+                grids[i] = e
+        
+        if cell_batches:
+            batch = torch.cat(cell_batches)
+            full_batch = 4 * self.batch_images
+            if self.device.type == 'cuda' and len(batch) < full_batch:
+                # Pad short batches (the last group, cache hits, failed downloads) to the
+                # warmed-up size so the compiled CUDA graph is replayed, not re-recorded
+                batch = torch.cat([batch, batch.new_zeros((full_batch - len(batch), *batch.shape[1:]))])
+            logits = self.predict_logits(batch)[:4 * len(loaded)]
+            cell_predictions = self.get_top_predictions_from_logits(logits, top_k)
+            for n, (i, image_url, size) in enumerate(loaded):
+                grids[i] = size, cell_predictions[4 * n:4 * n + 4]
+                
+                cache_path = self._cache_path(image_url)
+                if cache_path:
+                    # Written under a temporary name so an interrupted write is never loaded
+                    with open(cache_path + '.tmp', 'w') as f:
+                        json.dump({'size': list(size), 'top_k': top_k, 'cells': grids[i][1]}, f)
+                    os.replace(cache_path + '.tmp', cache_path)
+        
+        return grids
@@ -4,27 +4,23 @@ Hybrid Analyzer: Single Evidence + Quality Control
 Allows high-confidence single-evidence mappings while maintaining validation
 """
 
-import torch
+import numpy as np
 import timm
-from PIL import Image
-import requests
-from io import BytesIO
+from torchvision import transforms
 import json
 import time
 import os
 from collections import defaultdict, Counter
+from grid_analyzer_base import GridAnalyzerBase, GRID_POSITIONS, IMAGE_URL
 
-class HybridVocabAnalyzer:
-    def __init__(self, model_name="tf_efficientnetv2_l.in21k", vocab_file="vocab/vocab_list.txt"):
+class HybridVocabAnalyzer(GridAnalyzerBase):
+    def __init__(self, model_name="tf_efficientnetv2_l.in21k", vocab_file="vocab/vocab_list.txt", use_trt=False,
+                 cache_dir=None):
         print(f"🚀 Loading {model_name} model...")
         
-        # Load model
-        self.model = timm.create_model(model_name, pretrained=True)
-        self.model.eval()
-        
-        # Get data transforms
-        data_config = timm.data.resolve_model_data_config(self.model)
-        self.transforms = timm.data.create_transform(**data_config, is_training=False)
+        # Load model; predictions do not depend on the mappings built between
+        # images, so 4 images (16 cells) can share one forward pass
+        super().__init__(model_name, use_trt=use_trt, cache_dir=cache_dir, batch_images=4)
         
         # Load vocabulary terms
         try:
@@ -37,7 +33,14 @@ class HybridVocabAnalyzer:
         
         # Hybrid mapping system
         self.class_mapping = {}
+        # Dense class index -> position in _mapped_terms (-1 = unmapped) for matching
+        self._mapping_arr = np.full(self.num_classes, -1, dtype=np.int32)
+        self._mapped_terms = []
         self.discovered_classes = defaultdict(list)
+        # Running per-class evidence totals, and classes with evidence not yet built
+        self._evidence = defaultdict(lambda: {'vocab_counts': Counter(), 'total_confidence': 0.0,
+                                              'high_confidence_count': 0})
+        self._touched_classes = {}
         self.validation_stats = defaultdict(dict)
         self.detection_frequency = Counter()
         self.results = []
@@ -45,32 +48,15 @@ class HybridVocabAnalyzer:
         
         print(f"✅ Hybrid analyzer ready!")
     
-    def predict_image(self, image):
-        """Predict image with EfficientNet-21k"""
-        input_tensor = self.transforms(image).unsqueeze(0)
-        
-        with torch.no_grad():
-            outputs = self.model(input_tensor)
-            probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-        
-        return probabilities.numpy()
-    
-    def get_top_predictions(self, probabilities, top_k=20):
-        """Get top-k predictions with confidence scores"""
-        top_indices = probabilities.argsort()[-top_k:][::-1]
-        
-        predictions = []
-        for i, idx in enumerate(top_indices):
-            confidence = float(probabilities[idx])
-            predictions.append({
-                'rank': i + 1,
-                'class_idx': str(idx),
-                'class_name': f"class_{idx}",
-                'confidence': confidence,
-                'confidence_percent': confidence * 100
-            })
-        
-        return predictions
+    def _setup_preprocessing(self):
+        """timm eval transforms: the resize/crop steps run on the device on tensor
+        views of the grid cells, followed by in-place normalization"""
+        data_config = timm.data.resolve_model_data_config(self.model)
+        steps = timm.data.create_transform(**data_config, is_training=False).transforms
+        to_tensor = next(i for i, t in enumerate(steps) if 'ToTensor' in type(t).__name__)
+        self.input_size = tuple(data_config['input_size'])
+        self.cell_transform = transforms.Compose(steps[:to_tensor])
+        self._set_normalization(data_config['mean'], data_config['std'])
     
     def discover_class_mappings_hybrid(self, predictions, expected_vocab=None):
         """HYBRID: Allow single evidence for very high confidence, multiple for moderate"""
@@ -94,7 +80,7 @@ class HybridVocabAnalyzer:
             if confidence > 70.0:
                 # IMMEDIATE MAPPING for very high confidence
                 print(f"   🎯 IMMEDIATE: Class {class_idx} -> '{expected_vocab}' ({confidence:.1f}% - very high confidence)")
-                self.class_mapping[class_idx] = expected_vocab.lower()
+                self._add_mapping(class_idx, expected_vocab.lower())
                 self.validation_stats[class_idx] = {
                     'vocab_term': expected_vocab,
                     'evidence_count': 1,
@@ -112,7 +98,7 @@ class HybridVocabAnalyzer:
                     'rank': i + 1,
                     'mapping_type': 'single_evidence_validated'
                 }
-                self.discovered_classes[class_idx].append(discovery_info)
+                self._add_discovery(class_idx, discovery_info)
                 print(f"   ✅ SINGLE EVIDENCE: Class {class_idx} -> '{expected_vocab}' ({confidence:.1f}% - high confidence)")
                 
             elif confidence > 30.0:
@@ -123,32 +109,49 @@ class HybridVocabAnalyzer:
                     'rank': i + 1,
                     'mapping_type': 'multiple_evidence_required'
                 }
-                self.discovered_classes[class_idx].append(discovery_info)
+                self._add_discovery(class_idx, discovery_info)
                 print(f"   ⚖️ EVIDENCE: Class {class_idx} -> '{expected_vocab}' ({confidence:.1f}% - needs validation)")
     
-    def build_class_mapping_hybrid(self):
-        """Build hybrid class mapping with flexible evidence requirements"""
+    def _add_discovery(self, class_idx, discovery_info):
+        """Record evidence for a class and fold it into the running totals"""
+        self.discovered_classes[class_idx].append(discovery_info)
+        evidence = self._evidence[class_idx]
+        evidence['vocab_counts'][discovery_info['expected_vocab']] += 1
+        evidence['total_confidence'] += discovery_info['confidence']
+        if discovery_info['confidence'] > 50.0:
+            evidence['high_confidence_count'] += 1
+        self._touched_classes[class_idx] = None
+    
+    def _add_mapping(self, class_idx, vocab_term):
+        """Map a class to a vocabulary term, keeping the lookup array in sync"""
+        self.class_mapping[class_idx] = vocab_term
+        self._mapping_arr[class_idx] = len(self._mapped_terms)
+        self._mapped_terms.append(vocab_term)
+    
+    def build_class_mapping_hybrid(self, touched_only=False):
+        """Build hybrid class mapping with flexible evidence requirements
+        
+        With touched_only=True only classes that gained evidence since the
+        last build are reconsidered; the others' outcome cannot have changed.
+        """
         new_mappings = {}
+        class_ids = list(self._touched_classes) if touched_only else list(self.discovered_classes)
+        self._touched_classes.clear()
         
-        for class_idx, discoveries in self.discovered_classes.items():
+        for class_idx in class_ids:
             if class_idx in self.class_mapping:  # Already mapped
                 continue
             
-            # Analyze discoveries
-            vocab_counts = Counter()
-            total_confidence = 0
-            high_confidence_count = 0
-            
-            for discovery in discoveries:
-                vocab_term = discovery['expected_vocab']
-                vocab_counts[vocab_term] += 1
-                total_confidence += discovery['confidence']
-                if discovery['confidence'] > 50.0:
-                    high_confidence_count += 1
-            
+            discoveries = self.discovered_classes[class_idx]
             if not discoveries:
                 continue
             
+            # Analyze discoveries
+            evidence = self._evidence[class_idx]
+            vocab_counts = evidence['vocab_counts']
+            total_confidence = evidence['total_confidence']
+            high_confidence_count = evidence['high_confidence_count']
+            
             # Quality metrics
             avg_confidence = total_confidence / len(discoveries)
             most_common_vocab, occurrence_count = vocab_counts.most_common(1)[0]
@@ -199,7 +202,8 @@ class HybridVocabAnalyzer:
         
         # Update mappings
         old_count = len(self.class_mapping)
-        self.class_mapping.update(new_mappings)
+        for class_idx, vocab_term in new_mappings.items():
+            self._add_mapping(class_idx, vocab_term)
         new_count = len(self.class_mapping)
         
         if new_count > old_count:
@@ -211,11 +215,14 @@ class HybridVocabAnalyzer:
         """Match vocabulary terms using hybrid mappings"""
         vocab_matches = []
         
-        for pred in predictions[:10]:
-            class_idx = pred['class_idx']
-            
-            if class_idx in self.class_mapping:
-                vocab_term = self.class_mapping[class_idx]
+        # One vectorized lookup for all top-10 classes; only hits are visited
+        top_predictions = predictions[:10]
+        hits = self._mapping_arr[[pred['class_idx'] for pred in top_predictions]]
+        
+        for pred, hit in zip(top_predictions, hits.tolist()):
+            if hit >= 0:
+                class_idx = pred['class_idx']
+                vocab_term = self._mapped_terms[hit]
                 quality_score = self.validation_stats.get(class_idx, {}).get('quality_score', 0)
                 mapping_type = self.validation_stats.get(class_idx, {}).get('mapping_type', 'unknown')
                 
@@ -232,38 +239,30 @@ class HybridVocabAnalyzer:
         vocab_matches.sort(key=lambda x: (-x['similarity'], -x['quality_score']))
         return vocab_matches
     
-    def analyze_image_hybrid(self, image_url, screenshot_id, expected_vocab=None):
-        """Analyze image with hybrid approach"""
+    def analyze_image_hybrid(self, image_url, screenshot_id, expected_vocab=None, prefetched=None, grid=None):
+        """Analyze image with hybrid approach
+        
+        `grid` is this image's entry from predict_grids(); without it the
+        image is downloaded (unless prefetched) and predicted on its own.
+        """
         try:
             print(f"📸 Processing vocab-{screenshot_id}.png (expected: {expected_vocab})")
             
-            # Download image
-            response = requests.get(image_url, timeout=10)
-            full_image = Image.open(BytesIO(response.content)).convert('RGB')
-            
-            # Get image dimensions
-            width, height = full_image.size
-            
-            # Extract 2x2 grid cells
-            grid_cells = {
-                'top_left': full_image.crop((0, 0, width//2, height//2)),
-                'top_right': full_image.crop((width//2, 0, width, height//2)),
-                'bottom_left': full_image.crop((0, height//2, width//2, height)),
-                'bottom_right': full_image.crop((width//2, height//2, width, height))
-            }
+            # Predictions for all 4 grid cells, from a batched forward pass
+            if grid is None:
+                grid = self.predict_grid(image_url, prefetched, top_k=20)
+            elif isinstance(grid, Exception):
+                raise grid
+            _, cell_predictions = grid
             
             # Analyze each grid cell
             grid_results = {}
             image_has_correct_detection = False
             image_has_any_detection = False
             
-            for position, cell_image in grid_cells.items():
+            for position, predictions in zip(GRID_POSITIONS, cell_predictions):
                 self.total_cells_analyzed += 1
                 
-                # Get predictions
-                probabilities = self.predict_image(cell_image)
-                predictions = self.get_top_predictions(probabilities, top_k=20)
-                
                 # Discover mappings with hybrid approach
                 self.discover_class_mappings_hybrid(predictions, expected_vocab)
                 
@@ -307,26 +306,47 @@ class HybridVocabAnalyzer:
                 'success': False
             }
     
-    def run_hybrid_analysis(self, start_id=4, end_id=15):
-        """Run hybrid analysis that should find detections"""
+    def run_hybrid_analysis(self, start_id=4, end_id=15, jsonl_file=None):
+        """Run hybrid analysis that should find detections
+        
+        With jsonl_file set, full per-image results are streamed there and
+        self.results only keeps a summary of each image.
+        """
         print(f"🔄 HYBRID ANALYZER WITH SINGLE-EVIDENCE SUPPORT")
         print(f"📊 Processing vocab-{start_id:03d} to vocab-{end_id:03d}")
         print(f"🎯 Goal: Find legitimate detections with quality control")
         
         start_time = time.time()
         
-        for i in range(start_id, end_id + 1):
-            screenshot_id = f"{i:03d}"
-            vocab_index = i - 4
-            expected_vocab = self.vocab_terms[vocab_index] if vocab_index < len(self.vocab_terms) else None
-            
-            image_url = f"https://raw.githubusercontent.com/levante-framework/core-tasks/more-tasks-tested/golden-runs/vocab/vocab-{screenshot_id}.png"
-            
-            result = self.analyze_image_hybrid(image_url, screenshot_id, expected_vocab)
-            self.results.append(result)
-            
-            # Build mappings after each image (hybrid approach)
-            self.build_class_mapping_hybrid()
+        # Downloads and preprocessing run ahead on the thread pool while the current image is analyzed
+        prefetched = self._prefetch_images(IMAGE_URL.format(f"{i:03d}") for i in range(start_id, end_id + 1))
+        jsonl_f = open(jsonl_file, 'w', encoding='utf-8') if jsonl_file else None
+        
+        try:
+            for batch_start in range(start_id, end_id + 1, self.batch_images):
+                batch_ids = range(batch_start, min(batch_start + self.batch_images, end_id + 1))
+                
+                # One forward pass for the cells of the whole group of images
+                image_urls = [IMAGE_URL.format(f"{i:03d}") for i in batch_ids]
+                grids = self.predict_grids(image_urls, [next(prefetched) for _ in batch_ids], top_k=20)
+                
+                # Mappings are still discovered and built image by image, in order
+                for i, image_url, grid in zip(batch_ids, image_urls, grids):
+                    screenshot_id = f"{i:03d}"
+                    vocab_index = i - 4
+                    expected_vocab = self.vocab_terms[vocab_index] if vocab_index < len(self.vocab_terms) else None
+                    
+                    result = self.analyze_image_hybrid(image_url, screenshot_id, expected_vocab, grid=grid)
+                    self._record_result(result, jsonl_f)
+                    
+                    # Build mappings after each image (hybrid approach), only for classes it touched
+                    self.build_class_mapping_hybrid(touched_only=True)
+        finally:
+            if jsonl_f is not None:
+                jsonl_f.close()
+        
+        if jsonl_f is not None:
+            print(f"💾 Results streamed to {jsonl_file}")
         
         # Final mapping build
         self.build_class_mapping_hybrid()
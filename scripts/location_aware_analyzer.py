@@ -7,37 +7,25 @@ Only allow vocabulary detections in their correct images
 import os
 import json
 import time
-import requests
-from PIL import Image
-from io import BytesIO
 from collections import Counter, defaultdict
-import timm
-import torch
-from torchvision import transforms
+from grid_analyzer_base import GridAnalyzerBase, GRID_POSITIONS, IMAGE_URL
 
-class LocationAwareAnalyzer:
-    def __init__(self, model_name="tf_efficientnetv2_l.in21k", vocab_file="vocab/vocab_list.txt"):
+class LocationAwareAnalyzer(GridAnalyzerBase):
+    def __init__(self, model_name="tf_efficientnetv2_l.in21k", vocab_file="vocab/vocab_list.txt", use_trt=False,
+                 cache_dir=None, quantize=False):
         print(f"🔄 Initializing Location-Aware Analyzer...")
         
         # Load vocabulary
         with open(vocab_file, 'r', encoding='utf-8') as f:
             self.vocab_terms = [line.strip() for line in f.readlines()]
         
-        # Initialize model
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        # Initialize model; images are uploaded as uint8 and grid crops, the
+        # 224x224 resize and normalization all run on the device
+        # Mappings are image-specific, so 4 images (16 cells) can share one forward pass
+        super().__init__(model_name, use_trt=use_trt, cache_dir=cache_dir, batch_images=4, quantize=quantize,
+                         num_classes=21843)
         print(f"🖥️ Using device: {self.device}")
         
-        self.model = timm.create_model(model_name, pretrained=True, num_classes=21843)
-        self.model.to(self.device)
-        self.model.eval()
-        
-        # Image preprocessing
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-        
         # Analysis state
         self.image_specific_mappings = {}  # {screenshot_id: {class_idx: vocab_term}}
         self.detection_frequency = Counter()
@@ -47,32 +35,6 @@ class LocationAwareAnalyzer:
         print(f"📚 Loaded {len(self.vocab_terms)} vocabulary terms")
         print(f"🎯 Ready for location-aware analysis!")
     
-    def predict_image(self, image):
-        """Predict image using EfficientNet-21k"""
-        image_tensor = self.transform(image).unsqueeze(0).to(self.device)
-        
-        with torch.no_grad():
-            outputs = self.model(image_tensor)
-            probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-            
-        return probabilities.cpu().numpy()
-    
-    def get_top_predictions(self, probabilities, top_k=20):
-        """Get top predictions with confidence scores"""
-        indices = probabilities.argsort()[::-1][:top_k]
-        
-        predictions = []
-        for i, idx in enumerate(indices):
-            predictions.append({
-                'rank': i + 1,
-                'class_idx': str(idx),
-                'class_name': f'class_{idx}',
-                'confidence': float(probabilities[idx]),
-                'confidence_percent': float(probabilities[idx] * 100)
-            })
-        
-        return predictions
-    
     def discover_location_specific_mappings(self, predictions, screenshot_id, expected_vocab):
         """Discover class mappings ONLY for the specific image they appear in"""
         if not expected_vocab:
@@ -119,38 +81,30 @@ class LocationAwareAnalyzer:
         vocab_matches.sort(key=lambda x: -x['similarity'])
         return vocab_matches
     
-    def analyze_image_location_aware(self, image_url, screenshot_id, expected_vocab=None):
-        """Analyze image with location-aware approach"""
+    def analyze_image_location_aware(self, image_url, screenshot_id, expected_vocab=None, grid=None):
+        """Analyze image with location-aware approach
+        
+        `grid` is this image's entry from predict_grids(); without it the
+        image is downloaded and predicted on its own.
+        """
         try:
             print(f"🔍 Analyzing vocab-{screenshot_id} (expected: {expected_vocab})")
             
-            # Download image
-            response = requests.get(image_url, timeout=10)
-            full_image = Image.open(BytesIO(response.content)).convert('RGB')
-            
-            # Get image dimensions
-            width, height = full_image.size
-            
-            # Extract 2x2 grid cells
-            grid_cells = {
-                'top_left': full_image.crop((0, 0, width//2, height//2)),
-                'top_right': full_image.crop((width//2, 0, width, height//2)),
-                'bottom_left': full_image.crop((0, height//2, width//2, height)),
-                'bottom_right': full_image.crop((width//2, height//2, width, height))
-            }
+            # Predictions for all 4 grid cells, from a batched forward pass
+            if grid is None:
+                grid = self.predict_grid(image_url, top_k=20)
+            elif isinstance(grid, Exception):
+                raise grid
+            (width, height), cell_predictions = grid
             
             # Analyze each grid cell
             grid_results = {}
             image_has_correct_detection = False
             image_has_any_detection = False
             
-            for position, cell_image in grid_cells.items():
+            for position, predictions in zip(GRID_POSITIONS, cell_predictions):
                 self.total_cells_analyzed += 1
                 
-                # Get predictions
-                probabilities = self.predict_image(cell_image)
-                predictions = self.get_top_predictions(probabilities, top_k=20)
-                
                 # Discover mappings ONLY for this specific image
                 self.discover_location_specific_mappings(predictions, screenshot_id, expected_vocab)
                 
@@ -193,8 +147,12 @@ class LocationAwareAnalyzer:
                 'success': False
             }
     
-    def run_location_aware_analysis(self, start_id=4, end_id=173):
-        """Run location-aware analysis on all vocab images"""
+    def run_location_aware_analysis(self, start_id=4, end_id=173, jsonl_file=None):
+        """Run location-aware analysis on all vocab images
+        
+        With jsonl_file set, full per-image results are streamed there and
+        self.results only keeps a summary of each image.
+        """
         print(f"🎯 LOCATION-AWARE ANALYSIS")
         print(f"📊 Processing vocab-{start_id:03d} to vocab-{end_id:03d}")
         print(f"🔒 Each vocabulary term will ONLY be detected in its correct image")
@@ -203,24 +161,40 @@ class LocationAwareAnalyzer:
         start_time = time.time()
         processed_count = 0
         
-        for i in range(start_id, end_id + 1):
-            screenshot_id = f"{i:03d}"
-            vocab_index = i - 4
-            expected_vocab = self.vocab_terms[vocab_index] if vocab_index < len(self.vocab_terms) else None
-            
-            image_url = f"https://raw.githubusercontent.com/levante-framework/core-tasks/more-tasks-tested/golden-runs/vocab/vocab-{screenshot_id}.png"
-            
-            result = self.analyze_image_location_aware(image_url, screenshot_id, expected_vocab)
-            self.results.append(result)
-            
-            processed_count += 1
-            
-            # Progress update every 10 images
-            if processed_count % 10 == 0:
-                elapsed = time.time() - start_time
-                rate = processed_count / elapsed
-                remaining = (end_id - start_id + 1 - processed_count) / rate if rate > 0 else 0
-                print(f"   📊 Progress: {processed_count}/{end_id - start_id + 1} images ({rate:.1f}/s, ~{remaining:.0f}s remaining)")
+        # Downloads and preprocessing run ahead on the thread pool while the current image is analyzed
+        prefetched = self._prefetch_images(IMAGE_URL.format(f"{i:03d}") for i in range(start_id, end_id + 1))
+        jsonl_f = open(jsonl_file, 'w', encoding='utf-8') if jsonl_file else None
+        
+        try:
+            for batch_start in range(start_id, end_id + 1, self.batch_images):
+                batch_ids = range(batch_start, min(batch_start + self.batch_images, end_id + 1))
+                
+                # One forward pass for the cells of the whole group of images
+                image_urls = [IMAGE_URL.format(f"{i:03d}") for i in batch_ids]
+                grids = self.predict_grids(image_urls, [next(prefetched) for _ in batch_ids], top_k=20)
+                
+                for i, image_url, grid in zip(batch_ids, image_urls, grids):
+                    screenshot_id = f"{i:03d}"
+                    vocab_index = i - 4
+                    expected_vocab = self.vocab_terms[vocab_index] if vocab_index < len(self.vocab_terms) else None
+                    
+                    result = self.analyze_image_location_aware(image_url, screenshot_id, expected_vocab, grid)
+                    self._record_result(result, jsonl_f)
+                    
+                    processed_count += 1
+                    
+                    # Progress update every 10 images
+                    if processed_count % 10 == 0:
+                        elapsed = time.time() - start_time
+                        rate = processed_count / elapsed
+                        remaining = (end_id - start_id + 1 - processed_count) / rate if rate > 0 else 0
+                        print(f"   📊 Progress: {processed_count}/{end_id - start_id + 1} images ({rate:.1f}/s, ~{remaining:.0f}s remaining)")
+        finally:
+            if jsonl_f is not None:
+                jsonl_f.close()
+        
+        if jsonl_f is not None:
+            print(f"💾 Results streamed to {jsonl_file}")
         
         # Calculate final statistics
         total_time = time.time() - start_time
@@ -261,7 +235,7 @@ def main():
     for test_id in test_cases:
         vocab_index = int(test_id) - 4
         expected_vocab = analyzer.vocab_terms[vocab_index]
-        image_url = f"https://raw.githubusercontent.com/levante-framework/core-tasks/more-tasks-tested/golden-runs/vocab/vocab-{test_id}.png"
+        image_url = IMAGE_URL.format(test_id)
         
         result = analyzer.analyze_image_location_aware(image_url, test_id, expected_vocab)
         
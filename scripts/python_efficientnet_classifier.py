@@ -9,34 +9,147 @@ with support for grid cell analysis similar to the web application.
 import os
 import json
 import argparse
-from typing import List, Dict, Tuple, Optional
+import heapq
+from collections import defaultdict
+from typing import List, Dict, Tuple, Optional, Union
 from pathlib import Path
 import requests
+from io import BytesIO
 from PIL import Image
 import torch
 import numpy as np
 from transformers import EfficientNetImageProcessor, EfficientNetForImageClassification
 import timm
 from timm.data import resolve_model_data_config, create_transform
-from difflib import SequenceMatcher
+from torchvision import transforms
+from rapidfuzz import fuzz, process
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Expose a Hugging Face classifier as pixel_values -> logits for tracing."""
+    
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+
+def _http_session(cache_name: Optional[str] = None) -> requests.Session:
+    """A requests session whose keep-alive connections are reused across image downloads.
+    
+    With cache_name, successful responses are also cached on disk in that
+    SQLite file for a day, so rerunning over the same URLs skips the network.
+    """
+    if cache_name:
+        try:
+            import requests_cache
+        except ImportError:
+            raise RuntimeError("On-disk HTTP caching needs requests-cache: pip install requests-cache")
+        # WAL lets the DataLoader worker processes read and write the cache concurrently
+        session = requests_cache.CachedSession(cache_name, expire_after=86400, allowable_codes=(200,), wal=True)
+    else:
+        session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=8)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _open_image(image_path: str, http: Optional[requests.Session] = None) -> Image.Image:
+    """Open an image from a local path or URL as RGB."""
+    if image_path.startswith('http'):
+        response = (http or requests).get(image_path, timeout=30)
+        response.raise_for_status()
+        return Image.open(BytesIO(response.content)).convert('RGB')
+    return Image.open(image_path).convert('RGB')
+
+
+def _write_json(data, path: str):
+    """Write data as indented UTF-8 JSON, using the much faster orjson when it is installed."""
+    try:
+        import orjson
+    except ImportError:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        return
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+
+
+class _ImageFileDataset(torch.utils.data.Dataset):
+    """Decode image files or URLs into uint8 (C, H, W) tensors in DataLoader workers.
+    
+    Items are (path, (width, height), tensor), or (path, None, error message)
+    when the image cannot be read, so one bad image does not stop the batch.
+    """
+    
+    def __init__(self, image_paths: List[str], http_cache: Optional[str] = None):
+        self.image_paths = image_paths
+        self.http_cache = http_cache
+        self._http = None  # Created lazily, so each worker process gets its own pool
+    
+    def __len__(self):
+        return len(self.image_paths)
+    
+    def __getitem__(self, index):
+        image_path = self.image_paths[index]
+        try:
+            if self._http is None and image_path.startswith('http'):
+                self._http = _http_session(self.http_cache)
+            image = _open_image(image_path, self._http)
+            return image_path, image.size, transforms.functional.pil_to_tensor(image)
+        except Exception as e:
+            return image_path, None, str(e)
+
 
 class VocabularyClassifier:
-    def __init__(self, model_name: str = "google/efficientnet-b7", vocab_file: str = "vocab/vocab_list.txt"):
+    def __init__(self, model_name: str = "google/efficientnet-b7", vocab_file: str = "vocab/vocab_list.txt",
+                 torchscript: bool = False, trt_engine: bool = False, engine_batch_size: int = 8,
+                 fast_resize: bool = False, http_cache: Optional[str] = None, fuzzy: bool = False):
         """
         Initialize the vocabulary classifier.
         
         Args:
             model_name: Hugging Face model name or timm model name
             vocab_file: Path to vocabulary list file
+            torchscript: Run a frozen TorchScript model optimized for inference
+                instead of the torch.compile'd one
+            trt_engine: Run an FP16 TensorRT engine (CUDA only, needs torch-tensorrt)
+            engine_batch_size: Largest batch_classify batch size the engine must accept
+            fast_resize: Resize Hugging Face model inputs with BILINEAR instead of the
+                processor's (usually BICUBIC) filter
+            http_cache: SQLite file to cache downloaded image URLs in (needs requests-cache)
+            fuzzy: Also score vocab terms by character-level similarity, not only
+                by shared words (slower, more loose matches)
         """
         self.model_name = model_name
         self.vocab_file = vocab_file
+        self.torchscript = torchscript
+        self.trt_engine = trt_engine
+        self.engine_batch_size = engine_batch_size
+        self.fast_resize = fast_resize
+        self.fuzzy = fuzzy
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.http_cache = http_cache
+        self._http = _http_session(http_cache)
         
         # Load vocabulary
         self.vocab_list = self._load_vocabulary()
         print(f"Loaded {len(self.vocab_list)} vocabulary terms")
         
+        # Lowercased terms and their word sets, computed once for matching
+        self._vocab_lower = [vocab_term.lower() for vocab_term in self.vocab_list]
+        self._vocab_tokens = [frozenset(vocab_lower.split()) for vocab_lower in self._vocab_lower]
+        # Reverse indexes: lowercased term -> first vocab term, word -> indices of terms containing it
+        self._vocab_exact = {}
+        self._vocab_by_token = defaultdict(list)
+        for i, (vocab_term, vocab_lower) in enumerate(zip(self.vocab_list, self._vocab_lower)):
+            self._vocab_exact.setdefault(vocab_lower, vocab_term)
+            for token in self._vocab_tokens[i]:
+                self._vocab_by_token[token].append(i)
+        
         # Initialize model
         self.model = None
         self.processor = None
@@ -64,6 +177,11 @@ class VocabularyClassifier:
                 self.model = EfficientNetForImageClassification.from_pretrained(self.model_name)
                 self.model.to(self.device)
                 self.model.eval()
+                # Kept separately so class names survive wrapping/converting the model,
+                # as a list indexed by class id
+                id2label = self.model.config.id2label
+                self._class_names = [id2label.get(i, f"class_{i}") for i in range(self.model.config.num_labels)]
+                self._setup_hf_tensor_preprocessing()
                 print(f"Loaded Hugging Face model: {self.model_name}")
             else:
                 raise ValueError("Not a standard HF EfficientNet model")
@@ -82,47 +200,201 @@ class VocabularyClassifier:
                 data_config = resolve_model_data_config(self.model)
                 self.processor = create_transform(**data_config, is_training=False)
                 self.is_timm_model = True
+                # timm doesn't include class names by default
+                self._class_names = [f"imagenet_class_{i}" for i in range(self.model.num_classes)]
+                
+                # Same resize/crop steps, applied to uint8 tensors; ToTensor/Normalize are
+                # folded into one scale-and-shift on the device
+                steps = self.processor.transforms
+                to_tensor = next(i for i, t in enumerate(steps) if 'ToTensor' in type(t).__name__)
+                self._tensor_transform = transforms.Compose(steps[:to_tensor])
+                self._set_normalization(scale=1 / 255, mean=data_config['mean'], std=data_config['std'])
                 print(f"Loaded timm model: {self.model_name}")
                 
             except Exception as e2:
                 print(f"Failed to load timm model: {e2}")
                 raise RuntimeError(f"Could not load model {self.model_name}")
+        
+        if self.device.type == 'cuda':
+            # NHWC lets cuDNN pick Tensor Core conv kernels under FP16 autocast
+            self.model = self.model.to(memory_format=torch.channels_last)
+        
+        if self.trt_engine:
+            if self.device.type == 'cuda':
+                self.model = self._load_trt_engine()
+            else:
+                print("TensorRT needs a GPU, running the eager model instead")
+        elif self.torchscript:
+            self._script_model()
+        elif self.device.type == 'cuda':
+            self._compile_model()
+    
+    def _setup_hf_tensor_preprocessing(self):
+        """Mirror the HF image processor as tensor ops (resize/crop, then scale-and-shift)."""
+        processor = self.processor
+        if self.fast_resize:
+            interpolation = transforms.InterpolationMode.BILINEAR
+        elif isinstance(processor.resample, transforms.InterpolationMode):
+            interpolation = processor.resample
+        else:
+            interpolation = {0: transforms.InterpolationMode.NEAREST,
+                             2: transforms.InterpolationMode.BILINEAR}.get(int(processor.resample),
+                                                                           transforms.InterpolationMode.BICUBIC)
+        size = (processor.size['height'], processor.size['width'])
+        steps = [transforms.Resize(size, interpolation=interpolation, antialias=True)]
+        crop_size = (processor.crop_size['height'], processor.crop_size['width'])
+        # A center crop to the size the image was just resized to is a no-op
+        if processor.do_center_crop and crop_size != size:
+            steps.append(transforms.CenterCrop(crop_size))
+        self._tensor_transform = transforms.Compose(steps)
+        
+        std = np.array(processor.image_std, dtype=np.float64)
+        if getattr(processor, 'include_top', False):
+            # EfficientNet processors divide by std a second time for the classification head
+            std = std * std
+        self._set_normalization(scale=processor.rescale_factor, mean=processor.image_mean, std=std,
+                                offset=-1.0 if getattr(processor, 'rescale_offset', False) else 0.0)
+    
+    def _set_normalization(self, scale: float, mean, std, offset: float = 0.0):
+        """Store ((x * scale + offset) - mean) / std as one per-channel multiply-add on the device."""
+        mean = torch.tensor(np.asarray(mean, dtype=np.float64), dtype=torch.float32, device=self.device).view(1, -1, 1, 1)
+        std = torch.tensor(np.asarray(std, dtype=np.float64), dtype=torch.float32, device=self.device).view(1, -1, 1, 1)
+        self._norm_scale = scale / std
+        self._norm_shift = (offset - mean) / std
+    
+    def _autocast(self):
+        """FP16 (BF16 where supported) autocast on CUDA; a no-op context on CPU."""
+        dtype = torch.bfloat16 if self.device.type == 'cuda' and torch.cuda.is_bf16_supported() else torch.float16
+        return torch.autocast(device_type=self.device.type, dtype=dtype, enabled=self.device.type == 'cuda')
+    
+    def _compile_model(self):
+        """Compile the model with torch.compile, falling back to eager mode on failure."""
+        eager_model = self.model
+        try:
+            # Fused kernels + CUDA graph replay to cut per-call Python/dispatch overhead
+            self.model = torch.compile(self.model, mode="reduce-overhead", fullgraph=False)
+            
+            # Compilation happens on the first call; pay it here rather than on the first image
+            self._classify_batch([Image.new('RGB', (224, 224))], top_k=1)
+            print("Model compiled with torch.compile (reduce-overhead)")
+        except Exception as e:
+            print(f"torch.compile failed, using eager model: {e}")
+            self.model = eager_model
+    
+    def _script_model(self):
+        """Convert the model to frozen TorchScript, falling back to eager mode on failure."""
+        eager_model = self.model
+        try:
+            with torch.inference_mode():
+                if self.is_timm_model:
+                    scripted = torch.jit.script(self.model)
+                else:
+                    # HF models return ModelOutput objects, which script() cannot handle
+                    example = self._preprocess([Image.new('RGB', (224, 224))]).to(self.device)
+                    scripted = torch.jit.trace(_LogitsOnly(self.model), example)
+            
+            # Freezes the module (inlining weights as constants) and applies inference-only rewrites
+            self.model = torch.jit.optimize_for_inference(scripted)
+            
+            # Two warm-up passes let the profiling executor specialize the graph
+            for _ in range(2):
+                self._classify_batch([Image.new('RGB', (224, 224))], top_k=1)
+            print("Model converted to TorchScript (optimize_for_inference)")
+        except Exception as e:
+            print(f"TorchScript conversion failed, using eager model: {e}")
+            self.model = eager_model
     
-    def _similarity_score(self, text1: str, text2: str) -> float:
-        """Calculate similarity between two strings."""
-        return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+    def _load_trt_engine(self):
+        """Load the cached FP16 TensorRT engine, building it on first use.
+        
+        The engine accepts 1..5x engine_batch_size rows, so single images
+        with their grid cells and full batch_classify batches all fit.
+        """
+        try:
+            import torch_tensorrt
+        except ImportError:
+            raise RuntimeError("TensorRT inference needs torch-tensorrt: pip install torch-tensorrt")
+        
+        example = self._preprocess([Image.new('RGB', (224, 224))]).to(self.device)
+        _, channels, height, width = example.shape
+        engine_path = (Path('trt_engines') /
+                       f"{self.model_name.replace('/', '_')}_fp16_{height}x{width}_b{self.engine_batch_size}.ts")
+        if engine_path.exists():
+            print(f"Loading cached TensorRT engine: {engine_path}")
+            return torch.jit.load(str(engine_path), map_location=self.device)
+        
+        print("Building TensorRT FP16 engine...")
+        model = self.model if self.is_timm_model else _LogitsOnly(self.model)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+        
+        engine = torch_tensorrt.compile(
+            traced, ir='ts',
+            inputs=[torch_tensorrt.Input(min_shape=(1, channels, height, width),
+                                         opt_shape=(5, channels, height, width),
+                                         max_shape=(self.engine_batch_size * 5, channels, height, width),
+                                         dtype=torch.float32)],
+            enabled_precisions={torch.float32, torch.float16}, device=self.device)
+        
+        engine_path.parent.mkdir(exist_ok=True)
+        torch.jit.save(engine, str(engine_path))
+        print(f"TensorRT engine saved to {engine_path}")
+        return engine
     
     def _find_vocab_matches(self, predictions: List[Dict], threshold: float = 0.3) -> List[Dict]:
         """Find vocabulary matches in predictions."""
         matches = []
+        if not predictions or not self.vocab_list:
+            return matches
         
-        for pred in predictions:
-            class_name = pred['class_name'].lower()
+        class_names = [pred['class_name'].lower() for pred in predictions]
+        
+        # Exact matches come straight from the index; nothing can beat them
+        best = {}
+        for i, class_name in enumerate(class_names):
+            if class_name in self._vocab_exact:
+                best[i] = (self._vocab_exact[class_name], 1.0)
+        
+        remaining = [i for i in range(len(class_names)) if i not in best]
+        if self.fuzzy and remaining:
+            # Character-level similarity of every remaining (prediction, vocab term) pair in one vectorized call
+            similarity = (process.cdist([class_names[i] for i in remaining], self._vocab_lower, scorer=fuzz.ratio,
+                                        score_cutoff=threshold * 100, dtype=np.float64, workers=-1) / 100.0).tolist()
+        else:
+            # The word-level check already covers every pair sharing a token,
+            # so no similarity tier runs without --fuzzy
+            similarity = [None] * len(remaining)
+        
+        for i, similarity_row in zip(remaining, similarity):
+            class_name = class_names[i]
+            # Vocab terms sharing a word with the class name
+            word_matches = {j for token in set(class_name.split()) for j in self._vocab_by_token.get(token, ())}
             best_match = None
             best_score = 0
             
-            for vocab_term in self.vocab_list:
-                vocab_lower = vocab_term.lower()
-                
-                # Exact match
-                if vocab_lower == class_name:
-                    score = 1.0
+            for j, (vocab_term, vocab_lower) in enumerate(zip(self.vocab_list, self._vocab_lower)):
                 # Partial match (vocab term in class name or vice versa)
-                elif vocab_lower in class_name or class_name in vocab_lower:
+                if vocab_lower in class_name or class_name in vocab_lower:
                     score = 0.8
                 # Word-level match
-                elif any(word in class_name.split() for word in vocab_lower.split()) or \
-                     any(word in vocab_lower.split() for word in class_name.split()):
+                elif j in word_matches:
                     score = 0.6
                 # Similarity match
+                elif similarity_row is not None:
+                    score = similarity_row[j]
                 else:
-                    score = self._similarity_score(class_name, vocab_lower)
+                    continue
                 
                 if score > best_score and score >= threshold:
                     best_score = score
                     best_match = vocab_term
             
             if best_match:
+                best[i] = (best_match, best_score)
+        
+        for i, pred in enumerate(predictions):
+            if i in best:
+                best_match, best_score = best[i]
                 matches.append({
                     'prediction': pred,
                     'vocab_term': best_match,
@@ -132,74 +404,143 @@ class VocabularyClassifier:
         
         return matches
     
+    def _pil_to_tensor(self, image: Image.Image) -> torch.Tensor:
+        """Convert a PIL image to a uint8 (C, H, W) tensor on the device (one copy per image)."""
+        tensor = transforms.functional.pil_to_tensor(image)
+        if self.device.type == 'cuda':
+            tensor = tensor.pin_memory()
+        return tensor.to(self.device, non_blocking=True)
+    
+    def _preprocess(self, images: List) -> torch.Tensor:
+        """Preprocess PIL images or uint8 (C, H, W) tensors into a normalized batch on the device.
+        
+        Equal-sized images (such as the 4 cells of an even-sized grid) are
+        stacked and resized with one call instead of one call per image.
+        """
+        tensors = [image if isinstance(image, torch.Tensor) else self._pil_to_tensor(image) for image in images]
+        
+        same_shape = {}
+        for i, tensor in enumerate(tensors):
+            same_shape.setdefault(tuple(tensor.shape), []).append(i)
+        
+        resized = [None] * len(tensors)
+        for indices in same_shape.values():
+            group = self._tensor_transform(torch.stack([tensors[i] for i in indices]))
+            for i, tensor in zip(indices, group):
+                resized[i] = tensor
+        
+        batch = torch.stack(resized).float().mul_(self._norm_scale).add_(self._norm_shift)
+        if self.device.type == 'cuda':
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        return batch
+    
     def _classify_image(self, image: Image.Image, top_k: int = 10) -> List[Dict]:
         """Classify a single image."""
-        if self.is_timm_model:
-            # timm model processing
-            input_tensor = self.processor(image).unsqueeze(0).to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model(input_tensor)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                
-            # Get top predictions
-            top_probs, top_indices = torch.topk(probabilities, top_k)
-            
-            # For timm models, we need to get class names from ImageNet
-            predictions = []
-            for i, (prob, idx) in enumerate(zip(top_probs[0], top_indices[0])):
-                predictions.append({
-                    'class_name': f"imagenet_class_{idx.item()}",  # timm doesn't include class names by default
-                    'confidence': prob.item(),
-                    'rank': i + 1
-                })
-                
-        else:
-            # Hugging Face transformers processing
-            inputs = self.processor(image, return_tensors="pt").to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                probabilities = torch.nn.functional.softmax(outputs.logits, dim=1)
-            
-            # Get top predictions
-            top_probs, top_indices = torch.topk(probabilities, top_k)
-            
-            predictions = []
-            for i, (prob, idx) in enumerate(zip(top_probs[0], top_indices[0])):
-                class_name = self.model.config.id2label.get(idx.item(), f"class_{idx.item()}")
-                predictions.append({
-                    'class_name': class_name,
-                    'confidence': prob.item(),
-                    'rank': i + 1
-                })
+        return self._classify_batch([image], top_k)[0]
+    
+    def _classify_batch(self, images: List, top_k: int = 10) -> List[List[Dict]]:
+        """Classify several images (PIL or uint8 tensors) with a single forward pass and a single top-k."""
+        pixel_values = self._preprocess(images)
+        
+        with torch.inference_mode():
+            with self._autocast():
+                outputs = self.model(pixel_values)
+            logits = outputs if isinstance(outputs, torch.Tensor) else outputs.logits
+            # Softmax in FP32 so small tail probabilities in the top-k do not underflow
+            probabilities = torch.nn.functional.softmax(logits.float(), dim=1)
         
-        return predictions
+        # Get top predictions; one device-to-host copy for the whole batch
+        top_probs, top_indices = torch.topk(probabilities, top_k, dim=1)
+        
+        batch_predictions = []
+        for row_probs, row_indices in zip(top_probs.tolist(), top_indices.tolist()):
+            batch_predictions.append([
+                {'class_name': self._class_names[idx], 'confidence': prob, 'rank': i + 1}
+                for i, (prob, idx) in enumerate(zip(row_probs, row_indices))
+            ])
+        
+        return batch_predictions
     
-    def _extract_grid_cells(self, image: Image.Image) -> List[Image.Image]:
-        """Extract 2x2 grid cells from image."""
-        width, height = image.size
+    def _extract_grid_cells(self, image: torch.Tensor) -> List[torch.Tensor]:
+        """Extract 2x2 grid cells from a (C, H, W) image tensor as views (no copies)."""
+        height, width = image.shape[-2:]
         cell_width = width // 2
         cell_height = height // 2
         
-        cells = []
-        positions = [
-            (0, 0, cell_width, cell_height),  # top-left
-            (cell_width, 0, width, cell_height),  # top-right
-            (0, cell_height, cell_width, height),  # bottom-left
-            (cell_width, cell_height, width, height)  # bottom-right
+        return [
+            image[:, :cell_height, :cell_width],  # top-left
+            image[:, :cell_height, cell_width:],  # top-right
+            image[:, cell_height:, :cell_width],  # bottom-left
+            image[:, cell_height:, cell_width:]  # bottom-right
         ]
+    
+    def _load_image(self, image_path: str) -> Image.Image:
+        """Load an image from a local path or URL."""
+        return _open_image(image_path, self._http)
+    
+    def _build_result(self, image_path: str, image_size: Tuple[int, int], predictions: List[Dict],
+                      cell_predictions: Optional[List[List[Dict]]] = None) -> Dict:
+        """Assemble the result dictionary for an image from its (and its grid cells') predictions."""
+        results = {
+            'image_path': image_path,
+            'image_size': image_size,
+            'full_image': None,
+            'grid_cells': None,
+            'vocab_matches': None,
+            'best_match': None
+        }
+        
+        # Full image
+        vocab_matches = self._find_vocab_matches(predictions)
+        
+        results['full_image'] = {
+            'predictions': predictions,
+            'vocab_matches': vocab_matches
+        }
+        
+        # Grid cell analysis
+        if cell_predictions is not None:
+            cell_results = []
+            
+            for i, predictions_for_cell in enumerate(cell_predictions):
+                cell_vocab_matches = self._find_vocab_matches(predictions_for_cell)
+                
+                cell_results.append({
+                    'position': ['top-left', 'top-right', 'bottom-left', 'bottom-right'][i],
+                    'predictions': predictions_for_cell,
+                    'vocab_matches': cell_vocab_matches
+                })
+            
+            results['grid_cells'] = cell_results
+            
+            # Find best overall match
+            all_matches = []
+            for cell_result in cell_results:
+                for match in cell_result['vocab_matches']:
+                    all_matches.append({
+                        'position': cell_result['position'],
+                        'match': match
+                    })
+            
+            if all_matches:
+                best_match = max(all_matches, key=lambda x: x['match']['match_score'])
+                results['best_match'] = best_match
         
-        for pos in positions:
-            cell = image.crop(pos)
-            cells.append(cell)
+        # Extract expected vocab term from filename if applicable
+        filename = Path(image_path).stem
+        if filename.startswith('vocab-') and filename[6:].isdigit():
+            vocab_index = int(filename[6:]) - 1  # Convert to 0-based index
+            if 0 <= vocab_index < len(self.vocab_list):
+                results['expected_vocab'] = self.vocab_list[vocab_index]
         
-        return cells
+        return results
     
     def classify_image(self, image_path: str, analyze_grid: bool = False, top_k: int = 10) -> Dict:
         """
         Classify an image and optionally analyze grid cells.
         
+        The full image and its grid cells are classified in one forward pass.
+        
         Args:
             image_path: Path to image file
             analyze_grid: Whether to analyze 2x2 grid cells
@@ -209,68 +550,16 @@ class VocabularyClassifier:
             Dictionary with classification results
         """
         try:
-            # Load image
-            if image_path.startswith('http'):
-                image = Image.open(requests.get(image_path, stream=True).raw).convert('RGB')
-            else:
-                image = Image.open(image_path).convert('RGB')
-            
-            results = {
-                'image_path': image_path,
-                'image_size': image.size,
-                'full_image': None,
-                'grid_cells': None,
-                'vocab_matches': None,
-                'best_match': None
-            }
-            
-            # Classify full image
-            predictions = self._classify_image(image, top_k)
-            vocab_matches = self._find_vocab_matches(predictions)
-            
-            results['full_image'] = {
-                'predictions': predictions,
-                'vocab_matches': vocab_matches
-            }
-            
-            # Grid cell analysis
-            if analyze_grid:
-                cells = self._extract_grid_cells(image)
-                cell_results = []
-                
-                for i, cell in enumerate(cells):
-                    cell_predictions = self._classify_image(cell, top_k)
-                    cell_vocab_matches = self._find_vocab_matches(cell_predictions)
-                    
-                    cell_results.append({
-                        'position': ['top-left', 'top-right', 'bottom-left', 'bottom-right'][i],
-                        'predictions': cell_predictions,
-                        'vocab_matches': cell_vocab_matches
-                    })
-                
-                results['grid_cells'] = cell_results
-                
-                # Find best overall match
-                all_matches = []
-                for cell_result in cell_results:
-                    for match in cell_result['vocab_matches']:
-                        all_matches.append({
-                            'position': cell_result['position'],
-                            'match': match
-                        })
-                
-                if all_matches:
-                    best_match = max(all_matches, key=lambda x: x['match']['match_score'])
-                    results['best_match'] = best_match
+            image = self._load_image(image_path)
+            image_size = image.size
+            # Decoded and uploaded once; the grid cells are views of the same tensor
+            image = self._pil_to_tensor(image)
             
-            # Extract expected vocab term from filename if applicable
-            filename = Path(image_path).stem
-            if filename.startswith('vocab-') and filename[6:].isdigit():
-                vocab_index = int(filename[6:]) - 1  # Convert to 0-based index
-                if 0 <= vocab_index < len(self.vocab_list):
-                    results['expected_vocab'] = self.vocab_list[vocab_index]
+            batch = [image] + (self._extract_grid_cells(image) if analyze_grid else [])
+            batch_predictions = self._classify_batch(batch, top_k)
             
-            return results
+            return self._build_result(image_path, image_size, batch_predictions[0],
+                                      batch_predictions[1:] if analyze_grid else None)
             
         except Exception as e:
             return {
@@ -278,37 +567,84 @@ class VocabularyClassifier:
                 'error': str(e)
             }
     
-    def batch_classify(self, image_dir: str, output_file: str = None, analyze_grid: bool = False) -> List[Dict]:
+    def batch_classify(self, image_dir: Union[str, List[str]], output_file: str = None, analyze_grid: bool = False,
+                       batch_size: int = 8, num_workers: Optional[int] = None) -> List[Dict]:
         """
         Classify all images in a directory.
         
         Args:
-            image_dir: Directory containing images
+            image_dir: Directory containing images, or a list of image paths/URLs
             output_file: Optional output JSON file
             analyze_grid: Whether to analyze grid cells
+            batch_size: Number of images (each with its grid cells) per forward pass
+            num_workers: Image decoding processes (default: half the CPU cores, 0 decodes inline)
             
         Returns:
             List of classification results
         """
-        image_dir = Path(image_dir)
-        image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}
+        if num_workers is None:
+            num_workers = (os.cpu_count() or 2) // 2
         
-        image_files = []
-        for ext in image_extensions:
-            image_files.extend(image_dir.glob(f'*{ext}'))
-            image_files.extend(image_dir.glob(f'*{ext.upper()}'))
+        if isinstance(image_dir, (list, tuple)):
+            # Explicit paths/URLs are kept in the given order
+            image_files = [str(image_path) for image_path in image_dir]
+            print(f"Classifying {len(image_files)} images")
+        else:
+            image_dir = Path(image_dir)
+            image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff'}
+            
+            image_files = []
+            for ext in image_extensions:
+                image_files.extend(image_dir.glob(f'*{ext}'))
+                image_files.extend(image_dir.glob(f'*{ext.upper()}'))
+            
+            print(f"Found {len(image_files)} images in {image_dir}")
+            
+            image_files = sorted(str(image_file) for image_file in image_files)
         
-        print(f"Found {len(image_files)} images in {image_dir}")
+        # Worker processes decode (and download) the next mini-batches while the
+        # current one is on the model
+        loader = torch.utils.data.DataLoader(
+            _ImageFileDataset(image_files, self.http_cache),
+            batch_size=batch_size, collate_fn=list, num_workers=num_workers,
+            pin_memory=self.device.type == 'cuda', prefetch_factor=2 if num_workers else None)
         
         results = []
-        for i, image_file in enumerate(sorted(image_files)):
-            print(f"Processing {i+1}/{len(image_files)}: {image_file.name}")
-            result = self.classify_image(str(image_file), analyze_grid=analyze_grid)
-            results.append(result)
+        processed = 0
+        for batch_items in loader:
+            # Images that failed to load are reported individually
+            batch_results = {}
+            loaded = []
+            for image_path, image_size, image in batch_items:
+                processed += 1
+                print(f"Processing {processed}/{len(image_files)}: {Path(image_path).name}")
+                if image_size is None:
+                    batch_results[image_path] = {'image_path': image_path, 'error': image}
+                else:
+                    loaded.append((image_path, image_size, image.to(self.device, non_blocking=True)))
+            
+            if loaded:
+                # Full images followed by all their grid cells, in one forward pass
+                batch = [image for _, _, image in loaded]
+                if analyze_grid:
+                    batch += [cell for _, _, image in loaded for cell in self._extract_grid_cells(image)]
+                try:
+                    batch_predictions = self._classify_batch(batch)
+                    for j, (image_path, image_size, _) in enumerate(loaded):
+                        cell_predictions = None
+                        if analyze_grid:
+                            cell_start = len(loaded) + 4 * j
+                            cell_predictions = batch_predictions[cell_start:cell_start + 4]
+                        batch_results[image_path] = self._build_result(image_path, image_size,
+                                                                       batch_predictions[j], cell_predictions)
+                except Exception as e:
+                    for image_path, _, _ in loaded:
+                        batch_results[image_path] = {'image_path': image_path, 'error': str(e)}
+            
+            results.extend(batch_results[image_path] for image_path, _, _ in batch_items)
         
         if output_file:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
+            _write_json(results, output_file)
             print(f"Results saved to {output_file}")
         
         return results
@@ -398,13 +734,30 @@ def main():
                        help='Analyze 2x2 grid cells')
     parser.add_argument('--top-k', type=int, default=10,
                        help='Number of top predictions to return')
+    parser.add_argument('--batch-size', type=int, default=8,
+                       help='Images per forward pass in batch mode')
+    parser.add_argument('--num-workers', type=int, default=None,
+                       help='Image decoding processes in batch mode (default: half the CPU cores)')
+    parser.add_argument('--torchscript', action='store_true',
+                       help='Run a frozen TorchScript model optimized for inference')
+    parser.add_argument('--trt-engine', action='store_true',
+                       help='Run an FP16 TensorRT engine (requires CUDA and torch-tensorrt)')
+    parser.add_argument('--fast-resize', action='store_true',
+                       help='Resize with BILINEAR instead of the processor filter (Hugging Face models)')
+    parser.add_argument('--http-cache', metavar='FILE',
+                       help='Cache downloaded image URLs in this SQLite file (requires requests-cache)')
+    parser.add_argument('--fuzzy', action='store_true',
+                       help='Also match vocabulary terms by character-level similarity')
     parser.add_argument('--analyze-performance', action='store_true',
                        help='Analyze vocabulary classification performance')
     
     args = parser.parse_args()
     
     # Initialize classifier
-    classifier = VocabularyClassifier(model_name=args.model, vocab_file=args.vocab)
+    classifier = VocabularyClassifier(model_name=args.model, vocab_file=args.vocab,
+                                      torchscript=args.torchscript, trt_engine=args.trt_engine,
+                                      engine_batch_size=args.batch_size, fast_resize=args.fast_resize,
+                                      http_cache=args.http_cache, fuzzy=args.fuzzy)
     
     if args.image:
         # Single image classification
@@ -413,7 +766,8 @@ def main():
         
     elif args.batch:
         # Batch classification
-        results = classifier.batch_classify(args.batch, args.output, analyze_grid=args.grid)
+        results = classifier.batch_classify(args.batch, args.output, analyze_grid=args.grid,
+                                            batch_size=args.batch_size, num_workers=args.num_workers)
         
         if args.analyze_performance:
             stats = classifier.analyze_vocab_performance(results)
@@ -426,10 +780,11 @@ def main():
             print(f"Overall accuracy: {stats['accuracy']:.2%}")
             
             # Show worst performing vocab terms
-            worst_performers = sorted(
-                [(term, perf) for term, perf in stats['vocab_term_performance'].items() if perf['total'] > 0],
+            worst_performers = heapq.nsmallest(
+                10,
+                ((term, perf) for term, perf in stats['vocab_term_performance'].items() if perf['total'] > 0),
                 key=lambda x: x[1]['accuracy']
-            )[:10]
+            )
             
             print("\nWorst performing vocabulary terms:")
             for term, perf in worst_performers:
@@ -8,6 +8,28 @@ import json
 import os
 from collections import Counter
 
+def load_analysis_file(path):
+    """Return (analysis_results iterator, class_mapping dict) for an analysis JSON file
+    
+    With ijson installed the results are streamed one at a time, so memory
+    stays flat however large the file is; otherwise the file is json.load()ed.
+    """
+    try:
+        import ijson
+    except ImportError:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return iter(data.get('analysis_results', [])), data.get('class_mapping', {})
+    
+    with open(path, 'rb') as f:
+        class_mapping = dict(ijson.kvitems(f, 'class_mapping'))
+    
+    def stream_results():
+        with open(path, 'rb') as f:
+            yield from ijson.items(f, 'analysis_results.item', use_float=True)
+    
+    return stream_results(), class_mapping
+
 def show_problem_resolution():
     """Demonstrate that the excessive bamboo/artichoke problem is solved"""
     
@@ -23,25 +45,17 @@ def show_problem_resolution():
         print(f"📁 Analyzing old results: {latest_old_file}")
         
         try:
-            with open(latest_old_file, 'r', encoding='utf-8') as f:
-                old_data = json.load(f)
-            
-            old_results = old_data.get('analysis_results', [])
-            old_class_mapping = old_data.get('class_mapping', {})
-            
-            # Count vocabulary frequencies
-            vocab_counts = Counter()
-            total_matches = 0
+            old_results, old_class_mapping = load_analysis_file(latest_old_file)
             
-            for result in old_results:
-                if result.get('success') and result.get('grid_results'):
-                    for position, cell_data in result['grid_results'].items():
-                        if cell_data.get('vocab_matches'):
-                            for match in cell_data['vocab_matches']:
-                                vocab_term = match.get('vocab_term')
-                                if vocab_term:
-                                    vocab_counts[vocab_term] += 1
-                                    total_matches += 1
+            # Count vocabulary frequencies in one Counter pass over all matches
+            vocab_counts = Counter(
+                match['vocab_term']
+                for result in old_results if result.get('success')
+                for cell_data in (result.get('grid_results') or {}).values()
+                for match in (cell_data.get('vocab_matches') or [])
+                if match.get('vocab_term')
+            )
+            total_matches = sum(vocab_counts.values())
             
             print(f"\n🚨 ORIGINAL PROBLEM (Before Fix):")
             print("-" * 60)
@@ -62,9 +76,7 @@ def show_problem_resolution():
             print(f"   🚨 Total problematic: {total_problematic:,} ({problematic_percentage:.1f}% of all matches)")
             
             # Show class mapping over-mapping
-            vocab_to_class_count = Counter()
-            for vocab_term in old_class_mapping.values():
-                vocab_to_class_count[vocab_term] += 1
+            vocab_to_class_count = Counter(old_class_mapping.values())
             
             print(f"\n🔍 CLASS MAPPING OVER-MAPPING:")
             print("-" * 60)
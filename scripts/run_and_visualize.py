@@ -5,6 +5,7 @@ Comprehensive analysis with visual results and web interface
 """
 
 import torch
+import numpy as np
 import timm
 from PIL import Image
 import requests
@@ -60,7 +61,8 @@ class VisualSmartAnalyzer:
     
     def get_top_predictions(self, probabilities, top_k=20):
         """Get top-k predictions with confidence scores"""
-        top_indices = probabilities.argsort()[-top_k:][::-1]
+        top_k_indices = np.argpartition(probabilities, -top_k)[-top_k:]
+        top_indices = top_k_indices[np.argsort(probabilities[top_k_indices])[::-1]]
         
         predictions = []
         for i, idx in enumerate(top_indices):
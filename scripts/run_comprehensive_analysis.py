@@ -7,6 +7,21 @@ Analyzes more vocabulary images to build comprehensive class mappings
 from github_vocab_analyzer import Enhanced21kVocabAnalyzer
 import json
 import time
+import heapq
+
+# Last image of each reporting phase
+PHASE_ENDS = {30: 'phase1', 60: 'phase2', 90: 'phase3'}
+
+def save_json(data, path):
+    """Write data as indented UTF-8 JSON, using the much faster orjson when it is installed"""
+    try:
+        import orjson
+    except ImportError:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        return
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
 def main():
     """Run comprehensive analysis with more images"""
@@ -15,33 +30,23 @@ def main():
     
     analyzer = Enhanced21kVocabAnalyzer()
     
-    # Phase 1: Build initial mappings (images 4-30)
-    print("\n🔍 Phase 1: Building class mappings from images 4-30...")
-    results_phase1, mappings_phase1 = analyzer.analyze_vocabulary_dataset(start_id=4, end_id=30)
-    
-    print(f"\n📊 Phase 1 Results:")
-    print(f"   Images analyzed: {len(results_phase1)}")
-    print(f"   Class mappings discovered: {len(mappings_phase1)}")
-    
-    # Phase 2: Expand mappings (images 31-60)
-    print("\n🔍 Phase 2: Expanding class mappings from images 31-60...")
-    results_phase2, mappings_phase2 = analyzer.analyze_vocabulary_dataset(start_id=31, end_id=60)
-    
-    print(f"\n📊 Phase 2 Results:")
-    print(f"   Images analyzed: {len(results_phase2)}")
-    print(f"   Total class mappings discovered: {len(mappings_phase2)}")
-    
-    # Phase 3: Final expansion (images 61-90)
-    print("\n🔍 Phase 3: Final expansion from images 61-90...")
-    results_phase3, mappings_phase3 = analyzer.analyze_vocabulary_dataset(start_id=61, end_id=90)
+    # One pass over images 4-90; phase milestones are reported as they are reached
+    phases = {}
     
-    print(f"\n📊 Phase 3 Results:")
-    print(f"   Images analyzed: {len(results_phase3)}")
-    print(f"   Total class mappings discovered: {len(mappings_phase3)}")
+    def report_phase(image_id, results):
+        if image_id not in PHASE_ENDS:
+            return
+        phase = PHASE_ENDS[image_id]
+        images_before = sum(p['images'] for p in phases.values())
+        phases[phase] = {'images': len(results) - images_before, 'mappings': len(analyzer.class_mapping)}
+        
+        print(f"\n📊 Phase {len(phases)} Results (images up to {image_id}):")
+        print(f"   Images analyzed: {phases[phase]['images']}")
+        print(f"   Total class mappings discovered: {phases[phase]['mappings']}")
     
-    # Combine all results
-    all_results = results_phase1 + results_phase2 + results_phase3
-    final_mappings = mappings_phase3  # This includes all accumulated mappings
+    print("\n🔍 Building class mappings from images 4-90...")
+    all_results, final_mappings = analyzer.analyze_vocabulary_dataset(start_id=4, end_id=90,
+                                                                      progress_callback=report_phase)
     
     print(f"\n🎯 Final Comprehensive Results:")
     print(f"   Total images analyzed: {len(all_results)}")
@@ -70,19 +75,14 @@ def main():
         'discovered_classes': dict(analyzer.discovered_classes),
         'statistics': {
             'total_images': len(all_results),
-            'total_processing_time': sum(r.get('processing_time', 0) for r in all_results if 'processing_time' in r),
+            'total_processing_time': analyzer.total_processing_time,
             'class_mappings_found': len(final_mappings),
-            'phases': {
-                'phase1': {'images': len(results_phase1), 'mappings': len(mappings_phase1)},
-                'phase2': {'images': len(results_phase2), 'mappings': len(mappings_phase2)},
-                'phase3': {'images': len(results_phase3), 'mappings': len(mappings_phase3)}
-            }
+            'phases': phases
         }
     }
     
     output_file = f"comprehensive_21k_vocab_analysis_{int(time.time())}.json"
-    with open(output_file, 'w') as f:
-        json.dump(comprehensive_data, f, indent=2, ensure_ascii=False)
+    save_json(comprehensive_data, output_file)
     
     print(f"\n💾 Comprehensive results saved to: {output_file}")
     
@@ -95,8 +95,8 @@ def main():
             vocab_counts[vocab_term] = 1
     
     print(f"\n📚 Top Vocabulary Terms by Class Mapping Count:")
-    sorted_vocab = sorted(vocab_counts.items(), key=lambda x: x[1], reverse=True)
-    for i, (term, count) in enumerate(sorted_vocab[:20]):
+    top_vocab = heapq.nlargest(20, vocab_counts.items(), key=lambda x: x[1])
+    for i, (term, count) in enumerate(top_vocab):
         print(f"   {i+1:2d}. {term}: {count} class mappings")
     
     return comprehensive_data
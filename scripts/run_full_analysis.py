@@ -5,12 +5,187 @@ Automatically analyzes all 680 images (170 screenshots × 4 grid cells)
 """
 
 from github_vocab_analyzer import Enhanced21kVocabAnalyzer
+import os
+import sys
+import gc
 import json
 import time
-from collections import Counter
+import pickle
+import argparse
+import multiprocessing
+from collections import Counter, defaultdict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import torch
 
-def run_complete_analysis():
-    """Run complete analysis of all 170 vocabulary screenshots"""
+# Analyzer owned by each worker process and its initial class mapping (see _init_worker)
+_worker_analyzer = None
+_worker_initial_mapping = None
+
+@lru_cache(maxsize=4096)
+def _norm(term):
+    """Lowercased vocabulary term ('' for None/empty), computed once per distinct string"""
+    return term.lower() if term else ''
+
+def _release_memory():
+    """Collect garbage and hand cached CUDA blocks back to the driver between chunks"""
+    gc.collect()
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        torch.cuda.empty_cache()
+
+def _init_worker(num_threads):
+    """Load one analyzer per worker process, splitting the CPU cores between workers"""
+    global _worker_analyzer, _worker_initial_mapping
+    torch.set_num_threads(num_threads)
+    _worker_analyzer = Enhanced21kVocabAnalyzer()
+    _worker_initial_mapping = dict(_worker_analyzer.class_mapping)
+
+def _process_chunk(start_id, end_id, checkpoint_dir=None):
+    """Analyze one range of screenshots in a worker; returns (results, mappings, seconds)"""
+    # Every chunk starts from the initial mappings, so results do not depend on
+    # which chunks a worker happened to analyze before
+    _worker_analyzer.class_mapping = dict(_worker_initial_mapping)
+    _worker_analyzer.discovered_classes = defaultdict(list)
+    
+    chunk_start = time.perf_counter()
+    partial_path = _checkpoint_path(checkpoint_dir, start_id, end_id, '.partial_parallel')
+    chunk_results, chunk_mappings = _analyze_chunk(_worker_analyzer, start_id, end_id, partial_path)
+    _release_memory()
+    return chunk_results, chunk_mappings, time.perf_counter() - chunk_start
+
+def _analyze_chunk(analyzer, start_id, end_id, partial_path=None):
+    """Analyze one range of screenshots, resuming from its partial checkpoint
+    
+    With `partial_path` set, the chunk's results so far and the analyzer state
+    are saved after every screenshot, so an interrupted chunk restarts at its
+    first unfinished screenshot instead of from the beginning.
+    """
+    done_results = []
+    partial = _load_checkpoint(partial_path)
+    if partial is not None:
+        done_results = partial['results']
+        analyzer.class_mapping = partial['class_mapping']
+        analyzer.discovered_classes = defaultdict(list, partial['discovered_classes'])
+        print(f"♻️  Resuming vocab-{start_id:03d} to vocab-{end_id:03d} after {len(done_results)} screenshots")
+    
+    resume_id = start_id + len(done_results)
+    if resume_id > end_id:
+        return done_results, analyzer.class_mapping
+    
+    def save_partial(image_id, results):
+        _save_checkpoint(partial_path, done_results + results,
+                         analyzer.class_mapping, analyzer.discovered_classes)
+    
+    chunk_results, chunk_mappings = analyzer.analyze_vocabulary_dataset(
+        resume_id, end_id, progress_callback=save_partial if partial_path else None)
+    return done_results + chunk_results, chunk_mappings
+
+def _checkpoint_path(checkpoint_dir, start_id, end_id, suffix=''):
+    """Checkpoint file for one chunk (None when checkpointing is off)
+    
+    `suffix` names the per-screenshot checkpoints of an unfinished chunk:
+    '.partial' for sequential runs and '.partial_parallel' for worker runs,
+    whose chunks start from different analyzer state.
+    """
+    if not checkpoint_dir:
+        return None
+    return os.path.join(checkpoint_dir, f"chunk_{start_id:03d}_{end_id:03d}{suffix}.pkl")
+
+def _load_checkpoint(path):
+    """A chunk's saved {'results', 'class_mapping', 'discovered_classes'}, or None"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def _save_checkpoint(path, chunk_results, class_mapping, discovered_classes=None):
+    """Save a finished chunk with the analyzer state it left behind"""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name so an interrupted write is never loaded
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump({'results': chunk_results, 'class_mapping': class_mapping,
+                     'discovered_classes': discovered_classes}, f)
+    os.replace(path + '.tmp', path)
+
+def save_json(data, path):
+    """Write a results dict as compact UTF-8 JSON
+    
+    With orjson installed, each top-level value and each item of list values
+    (such as analysis_results) is serialized and written on its own, so the
+    whole document is never held in memory as one string. Those entries go
+    on their own lines; nothing inside them is indented.
+    """
+    try:
+        import orjson
+    except ImportError:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+        return
+    
+    option = orjson.OPT_NON_STR_KEYS
+    with open(path, 'wb') as f:
+        f.write(b'{')
+        for key_num, (key, value) in enumerate(data.items()):
+            f.write(b',\n' if key_num else b'\n')
+            f.write(orjson.dumps(str(key)) + b':')
+            if isinstance(value, list):
+                f.write(b'[')
+                for item_num, item in enumerate(value):
+                    f.write(b',\n' if item_num else b'\n')
+                    f.write(orjson.dumps(item, option=option))
+                f.write(b'\n]')
+            else:
+                f.write(orjson.dumps(value, option=option))
+        f.write(b'\n}\n')
+
+REPORT_TEMPLATE = """\
+🚀 ENHANCED EFFICIENTNET-21K COMPLETE VOCABULARY ANALYSIS
+{rule}
+
+Analysis completed: {completed}
+Screenshots analyzed: {total_screenshots}
+Grid cells processed: {total_grid_cells}
+Processing time: {processing_time_minutes:.1f} minutes
+Processing speed: {processing_speed_images_per_second:.1f} images/second
+
+PERFORMANCE RESULTS:
+- Images with vocabulary matches: {images_with_matches}/{total_screenshots} ({match_rate_percent:.1f}%)
+- Total vocabulary matches: {total_vocab_matches}
+- Accuracy rate: {accuracy_rate_percent:.1f}%
+- Class mappings discovered: {class_mappings_discovered}
+- Vocabulary terms mapped: {vocabulary_terms_mapped}
+
+TOP VOCABULARY TERMS:
+{top_terms}"""
+
+def write_report(output_data, path):
+    """Render the plain-text summary report for a full analysis's output_data and write it in one call"""
+    top_terms = list(output_data['performance_metrics']['top_vocabulary_terms'].items())[:15]
+    fields = {
+        **output_data['metadata'],
+        **output_data['performance_metrics'],
+        'rule': "=" * 80,
+        'completed': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'top_terms': ''.join(f"{i+1:2d}. {term}: {count} identifications\n"
+                             for i, (term, count) in enumerate(top_terms)),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(REPORT_TEMPLATE.format_map(fields))
+
+def run_complete_analysis(workers=1, checkpoint_dir=".vocab_cache/full_analysis"):
+    """Run complete analysis of all 170 vocabulary screenshots
+    
+    With workers > 1, chunks are analyzed in parallel worker processes,
+    each with its own model. Class mappings are then discovered per worker
+    and merged at the end, so later chunks no longer reuse mappings found in
+    earlier ones.
+    
+    Each finished chunk is checkpointed in `checkpoint_dir` together with
+    the class mapping state, so an interrupted run resumes where it stopped.
+    Checkpoints are removed once the results file is written.
+    """
     
     print("🚀 COMPLETE VOCABULARY ANALYSIS - ALL 170 SCREENSHOTS")
     print("=" * 80)
@@ -19,48 +194,123 @@ def run_complete_analysis():
     print("⏱️  Estimated time: 15-20 minutes")
     print("=" * 80)
     
-    # Initialize analyzer
-    analyzer = Enhanced21kVocabAnalyzer()
-    
     # Track all results
     all_results = []
-    start_time = time.time()
+    start_time = time.perf_counter()
+    
+    # The analyzer prints several lines per grid cell; on a terminal each would be
+    # its own write. Block-buffer stdout for the run and flush at chunk boundaries.
+    line_buffering = getattr(sys.stdout, 'line_buffering', False)
+    if line_buffering:
+        sys.stdout.reconfigure(line_buffering=False)
+    
+    def report_chunk(chunk_num, total_chunks, chunk_time, current_mappings):
+        # One status line per chunk, so progress stays readable between the analyzer's output
+        status = (f"   ✅ Chunk {chunk_num + 1}/{total_chunks} complete in {chunk_time:.1f}s"
+                  f" | 📊 {len(current_mappings)} class mappings"
+                  f" | 🎯 {len(all_results)}/170 ({len(all_results)/170*100:.1f}%)")
+        if len(all_results) > 0:
+            elapsed = time.perf_counter() - start_time
+            rate = len(all_results) / elapsed
+            remaining = 170 - len(all_results)
+            eta = remaining / rate if rate > 0 else 0
+            status += f" | ⏱️  ETA {eta/60:.1f} min"
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            status += f" | 🖥️  Peak GPU memory {torch.cuda.max_memory_allocated() / 1024**3:.2f} GB"
+        print(status)
+        sys.stdout.flush()
     
     try:
         # Process in chunks of 30 for better progress tracking
         chunk_size = 30
-        total_chunks = ((173 - 4 + 1) + chunk_size - 1) // chunk_size  # Ceiling division
+        chunk_ranges = [(start_id, min(start_id + chunk_size - 1, 173)) for start_id in range(4, 174, chunk_size)]
+        total_chunks = len(chunk_ranges)
         
-        for chunk_num in range(total_chunks):
-            start_id = 4 + (chunk_num * chunk_size)
-            end_id = min(start_id + chunk_size - 1, 173)
+        if workers > 1:
+            print(f"\n🔀 Analyzing {total_chunks} chunks in {workers} worker processes")
+            # Spawned workers each load their own model (CUDA cannot be shared with forked children)
+            ctx = multiprocessing.get_context("spawn")
+            num_threads = max(1, (os.cpu_count() or 1) // workers)
+            chunk_mappings = {}
+            pending = []
+            for chunk_num, (start_id, end_id) in enumerate(chunk_ranges):
+                checkpoint = _load_checkpoint(_checkpoint_path(checkpoint_dir, start_id, end_id))
+                if checkpoint is None:
+                    pending.append(chunk_num)
+                else:
+                    all_results.extend(checkpoint['results'])
+                    chunk_mappings[chunk_num] = checkpoint['class_mapping']
+            if len(pending) < total_chunks:
+                print(f"♻️  Resuming: {total_chunks - len(pending)} chunks loaded from {checkpoint_dir}")
             
-            print(f"\n🔍 CHUNK {chunk_num + 1}/{total_chunks}: Processing vocab-{start_id:03d} to vocab-{end_id:03d}")
-            print(f"   Progress: {len(all_results)}/170 images completed")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_init_worker, initargs=(num_threads,)) as executor:
+                futures = {executor.submit(_process_chunk, *chunk_ranges[chunk_num], checkpoint_dir): chunk_num
+                           for chunk_num in pending}
+                for future in as_completed(futures):
+                    chunk_num = futures[future]
+                    chunk_results, chunk_mappings[chunk_num], chunk_time = future.result()
+                    _save_checkpoint(_checkpoint_path(checkpoint_dir, *chunk_ranges[chunk_num]),
+                                     chunk_results, chunk_mappings[chunk_num])
+                    all_results.extend(chunk_results)
+                    report_chunk(chunk_num, total_chunks, chunk_time, chunk_mappings[chunk_num])
             
-            chunk_start = time.time()
-            chunk_results, current_mappings = analyzer.analyze_vocabulary_dataset(start_id, end_id)
-            chunk_time = time.time() - chunk_start
+            # Chunks finish in any order; restore screenshot order and merge mappings in chunk order
+            all_results.sort(key=lambda result: result['screenshot_id'])
+            current_mappings = {}
+            for chunk_num in sorted(chunk_mappings):
+                current_mappings.update(chunk_mappings[chunk_num])
+        else:
+            # Initialize analyzer
+            analyzer = Enhanced21kVocabAnalyzer()
             
-            all_results.extend(chunk_results)
+            # Chunks depend on the mappings discovered before them, so only a run of
+            # checkpointed chunks from the start is reused, with the state it left
+            resume_from = 0
+            for start_id, end_id in chunk_ranges:
+                checkpoint = _load_checkpoint(_checkpoint_path(checkpoint_dir, start_id, end_id))
+                if checkpoint is None or checkpoint['discovered_classes'] is None:
+                    break
+                all_results.extend(checkpoint['results'])
+                analyzer.class_mapping = checkpoint['class_mapping']
+                analyzer.discovered_classes = defaultdict(list, checkpoint['discovered_classes'])
+                current_mappings = analyzer.class_mapping
+                resume_from += 1
+            if resume_from:
+                print(f"♻️  Resuming after chunk {resume_from}: {len(all_results)} images loaded from {checkpoint_dir}")
             
-            print(f"   ✅ Chunk {chunk_num + 1} complete in {chunk_time:.1f}s")
-            print(f"   📊 Class mappings: {len(current_mappings)}")
-            print(f"   🎯 Total progress: {len(all_results)}/170 ({len(all_results)/170*100:.1f}%)")
+            # All remaining grid cells go through the model in large batches up front;
+            # the chunks below then only do mapping discovery and matching
+            if resume_from < total_chunks:
+                start_id, end_id = chunk_ranges[resume_from]
+                partial = _load_checkpoint(_checkpoint_path(checkpoint_dir, start_id, end_id, '.partial'))
+                first_id = start_id + len(partial['results']) if partial else start_id
+                analyzer.preload_grid_cells(first_id, 173, batch_size=64)
+                # The large preload batches are done; later chunks barely touch the GPU
+                _release_memory()
             
-            # Show ETA
-            if len(all_results) > 0:
-                elapsed = time.time() - start_time
-                rate = len(all_results) / elapsed
-                remaining = 170 - len(all_results)
-                eta = remaining / rate if rate > 0 else 0
-                print(f"   ⏱️  ETA: {eta/60:.1f} minutes remaining")
+            for chunk_num, (start_id, end_id) in enumerate(chunk_ranges[resume_from:], resume_from):
+                print(f"\n🔍 CHUNK {chunk_num + 1}/{total_chunks}: Processing vocab-{start_id:03d} to vocab-{end_id:03d}"
+                      f" ({len(all_results)}/170 images completed)")
+                
+                chunk_start = time.perf_counter()
+                chunk_results, current_mappings = _analyze_chunk(
+                    analyzer, start_id, end_id, _checkpoint_path(checkpoint_dir, start_id, end_id, '.partial'))
+                chunk_time = time.perf_counter() - chunk_start
+                
+                _save_checkpoint(_checkpoint_path(checkpoint_dir, start_id, end_id), chunk_results,
+                                 current_mappings, analyzer.discovered_classes)
+                
+                all_results.extend(chunk_results)
+                _release_memory()
+                report_chunk(chunk_num, total_chunks, chunk_time, current_mappings)
         
         # Final analysis
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
         total_images = len(all_results)
         total_grid_cells = total_images * 4
         final_mappings = current_mappings
+        unique_vocab_terms_mapped = len(set(final_mappings.values()))
         
         print(f"\n🎉 COMPLETE ANALYSIS FINISHED!")
         print(f"=" * 80)
@@ -68,7 +318,7 @@ def run_complete_analysis():
         print(f"   📸 Total screenshots analyzed: {total_images}")
         print(f"   🔲 Total grid cells processed: {total_grid_cells}")
         print(f"   🔍 Class mappings discovered: {len(final_mappings)}")
-        print(f"   📚 Vocabulary terms mapped: {len(set(final_mappings.values()))}")
+        print(f"   📚 Vocabulary terms mapped: {unique_vocab_terms_mapped}")
         print(f"   ⏱️  Total processing time: {total_time/60:.1f} minutes")
         print(f"   🚀 Processing speed: {total_grid_cells/total_time:.1f} images/second")
         print(f"=" * 80)
@@ -77,36 +327,33 @@ def run_complete_analysis():
         print(f"\n📈 VOCABULARY IDENTIFICATION PERFORMANCE:")
         print("-" * 60)
         
-        successful_images = 0
-        total_vocab_matches = 0
-        correct_identifications = 0
-        vocab_term_counts = Counter()
+        # Only successful screenshots with grid results take part in the passes below
+        successful_results = [result for result in all_results
+                              if result.get('success') and result.get('grid_results')]
+        
+        # Flatten once: every grid cell with matches, then every named match in those cells
+        matched_cells = [
+            (image_num, position, _norm(result.get('expected_vocab')), cell_data['vocab_matches'])
+            for image_num, result in enumerate(successful_results)
+            for position, cell_data in result['grid_results'].items()
+            if cell_data.get('vocab_matches')
+        ]
+        matched_terms = [
+            (match['vocab_term'], expected_vocab)
+            for _, _, expected_vocab, vocab_matches in matched_cells
+            for match in vocab_matches
+            if match.get('vocab_term')
+        ]
+        
+        successful_images = len({image_num for image_num, _, _, _ in matched_cells})
+        total_vocab_matches = sum(len(vocab_matches) for _, _, _, vocab_matches in matched_cells)
         grid_position_matches = {'top_left': 0, 'top_right': 0, 'bottom_left': 0, 'bottom_right': 0}
+        grid_position_matches.update(Counter(position for _, position, _, _ in matched_cells))
         
-        for result in all_results:
-            if result.get('success') and result.get('grid_results'):
-                image_has_vocab = False
-                expected_vocab = result.get('expected_vocab', '').lower() if result.get('expected_vocab') else ''
-                
-                for position, cell_data in result['grid_results'].items():
-                    if cell_data.get('vocab_matches') and len(cell_data['vocab_matches']) > 0:
-                        vocab_matches = cell_data['vocab_matches']
-                        total_vocab_matches += len(vocab_matches)
-                        
-                        if not image_has_vocab:
-                            successful_images += 1
-                            image_has_vocab = True
-                        
-                        grid_position_matches[position] += 1
-                        
-                        # Count vocabulary terms
-                        for match in vocab_matches:
-                            if match.get('vocab_term'):
-                                vocab_term_counts[match['vocab_term']] += 1
-                                
-                                # Check for correct identification
-                                if expected_vocab and match['vocab_term'].lower() == expected_vocab:
-                                    correct_identifications += 1
+        # Count vocabulary terms and correct identifications
+        vocab_term_counts = Counter(vocab_term for vocab_term, _ in matched_terms)
+        correct_identifications = sum(1 for vocab_term, expected_vocab in matched_terms
+                                      if expected_vocab and _norm(vocab_term) == expected_vocab)
         
         # Calculate rates
         match_rate = (successful_images / total_images * 100) if total_images > 0 else 0
@@ -144,22 +391,20 @@ def run_complete_analysis():
             ("150", "bandage")
         ]
         
+        # Index results by screenshot once (reversed, so the first result for an id wins)
+        results_by_id = {result.get('screenshot_id'): result for result in reversed(successful_results)}
+        
         for screenshot_id, expected_term in test_cases:
-            # Find this result in our data
-            test_result = None
-            for result in all_results:
-                if result.get('screenshot_id') == screenshot_id:
-                    test_result = result
-                    break
+            test_result = results_by_id.get(screenshot_id)
             
-            if test_result and test_result.get('success'):
+            if test_result:
                 found_expected = False
                 matches_found = []
                 for position, cell_data in test_result['grid_results'].items():
                     if cell_data.get('vocab_matches'):
                         for match in cell_data['vocab_matches'][:1]:  # Top match only
                             if match.get('vocab_term'):
-                                if match['vocab_term'].lower() == expected_term.lower():
+                                if _norm(match['vocab_term']) == _norm(expected_term):
                                     matches_found.append(f"✅ {match['vocab_term']} in {position}")
                                     found_expected = True
                                 else:
@@ -176,7 +421,7 @@ def run_complete_analysis():
                 'total_screenshots': total_images,
                 'total_grid_cells': total_grid_cells,
                 'class_mappings_discovered': len(final_mappings),
-                'vocabulary_terms_mapped': len(set(final_mappings.values())),
+                'vocabulary_terms_mapped': unique_vocab_terms_mapped,
                 'processing_time_minutes': total_time / 60,
                 'processing_speed_images_per_second': total_grid_cells / total_time
             },
@@ -194,33 +439,25 @@ def run_complete_analysis():
             'analysis_results': all_results
         }
         
-        # Save results
-        output_file = f"complete_170_vocab_analysis_{int(time.time())}.json"
-        with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        # Save results; the JSON and the text report are written concurrently
+        timestamp = int(time.time())
+        output_file = f"complete_170_vocab_analysis_{timestamp}.json"
+        report_file = f"vocabulary_analysis_summary_{timestamp}.txt"
+        with ThreadPoolExecutor(max_workers=2) as writers:
+            json_future = writers.submit(save_json, output_data, output_file)
+            report_future = writers.submit(write_report, output_data, report_file)
+        json_future.result()
+        report_future.result()
         
         print(f"\n💾 RESULTS SAVED:")
         print(f"   📁 File: {output_file}")
         
-        # Generate summary report
-        report_file = f"vocabulary_analysis_summary_{int(time.time())}.txt"
-        with open(report_file, 'w') as f:
-            f.write("🚀 ENHANCED EFFICIENTNET-21K COMPLETE VOCABULARY ANALYSIS\n")
-            f.write("=" * 80 + "\n\n")
-            f.write(f"Analysis completed: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Screenshots analyzed: {total_images}\n")
-            f.write(f"Grid cells processed: {total_grid_cells}\n")
-            f.write(f"Processing time: {total_time/60:.1f} minutes\n")
-            f.write(f"Processing speed: {total_grid_cells/total_time:.1f} images/second\n\n")
-            f.write(f"PERFORMANCE RESULTS:\n")
-            f.write(f"- Images with vocabulary matches: {successful_images}/{total_images} ({match_rate:.1f}%)\n")
-            f.write(f"- Total vocabulary matches: {total_vocab_matches}\n")
-            f.write(f"- Accuracy rate: {accuracy_rate:.1f}%\n")
-            f.write(f"- Class mappings discovered: {len(final_mappings)}\n")
-            f.write(f"- Vocabulary terms mapped: {len(set(final_mappings.values()))}\n\n")
-            f.write(f"TOP VOCABULARY TERMS:\n")
-            for i, (term, count) in enumerate(top_terms[:15]):
-                f.write(f"{i+1:2d}. {term}: {count} identifications\n")
+        # The run is complete, so its chunk checkpoints are no longer needed
+        for start_id, end_id in chunk_ranges:
+            for suffix in ('', '.partial', '.partial_parallel'):
+                checkpoint_path = _checkpoint_path(checkpoint_dir, start_id, end_id, suffix)
+                if checkpoint_path and os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
         
         print(f"   📄 Summary: {report_file}")
         
@@ -230,8 +467,10 @@ def run_complete_analysis():
         
     except KeyboardInterrupt:
         print(f"\n⚠️  Analysis interrupted by user")
-        print(f"⏱️  Partial analysis time: {(time.time() - start_time)/60:.1f} minutes")
+        print(f"⏱️  Partial analysis time: {(time.perf_counter() - start_time)/60:.1f} minutes")
         print(f"📊 Images processed: {len(all_results)}/170")
+        if checkpoint_dir:
+            print(f"♻️  Finished chunks are saved in {checkpoint_dir}; rerun to resume")
         return None
         
     except Exception as e:
@@ -240,7 +479,22 @@ def run_complete_analysis():
         print("- Internet connection issues")
         print("- GPU memory limitations") 
         print("- Disk space issues")
+        if checkpoint_dir:
+            print(f"♻️  Finished chunks are saved in {checkpoint_dir}; rerun to resume")
         return None
+    
+    finally:
+        sys.stdout.flush()
+        if line_buffering:
+            sys.stdout.reconfigure(line_buffering=True)
 
 if __name__ == "__main__":
-    run_complete_analysis() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Analyze all 170 vocabulary screenshots')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes analyzing chunks in parallel (each loads its own model)')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Do not checkpoint chunks or resume an interrupted run')
+    args = parser.parse_args()
+    
+    run_complete_analysis(workers=args.workers,
+                          checkpoint_dir=None if args.no_resume else ".vocab_cache/full_analysis") 
\ No newline at end of file
@@ -15,8 +15,8 @@ def run_full_location_aware_analysis():
     print("🔒 This will prevent cross-contamination and over-detection")
     print("=" * 80)
     
-    # Initialize analyzer
-    analyzer = LocationAwareAnalyzer()
+    # Initialize analyzer; cell predictions are cached so reruns skip downloads and inference
+    analyzer = LocationAwareAnalyzer(cache_dir=".vocab_cache")
     
     # Run complete analysis
     results = analyzer.run_location_aware_analysis()